@@ -0,0 +1,407 @@
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from common.observers import Counter, Observer
+from travelling_salesman import genetic_algorithm as tsp_ga
+from travelling_salesman import hill_climbing as tsp_hc
+from travelling_salesman import simulated_annealing as tsp_sa
+from travelling_salesman.environment import initialize_random_environment, load_tsplib
+from vehicle_routing import genetic_algorithm as vrp_ga
+from vehicle_routing import map_elites as vrp_me
+from vehicle_routing.environment import Environment, load_cvrplib
+
+SEED = 42
+TSP_SIZES = (25, 100, 500, 2000)
+VRP_INSTANCES = ((25, 3), (25, 5), (100, 5), (100, 10))
+
+# Antall generasjoner (eller steg) per løser
+GENERATIONS = {
+    "tsp_hc": 5000,
+    "tsp_sa": 20000,
+    "tsp_ga": 100,
+    "vrp_ga": 100,
+    "vrp_me": 5000,
+}
+TSP_GA_POPULATION = 100
+VRP_GA_POPULATION = 50
+
+
+class BenchmarkRecorder(Counter):
+    # Teller evalueringene løserne selv rapporterer, lagrer beste avstand hver
+    # gang den forbedres, og måler tiden fra første til siste generasjon, slik
+    # at oppsett og sluttevaluering ikke regnes med i tiden per generasjon
+    def __init__(self) -> None:
+        super().__init__()
+        self.curve = []
+        self.first_generation = None
+        self.first_time = None
+        self.first_evaluations = 0
+        self.last_time = None
+
+    def _record(self, distance: Optional[float]) -> None:
+        if distance is None:
+            return
+        if not self.curve or distance < self.curve[-1][1]:
+            elapsed = time.perf_counter() - self.start_time
+            self.curve.append((elapsed, float(distance)))
+
+    def on_generation(self, generation, metrics):
+        super().on_generation(generation, metrics)
+        now = time.perf_counter()
+        if self.first_time is None:
+            self.first_generation = generation
+            self.first_time = now
+            self.first_evaluations = self.evaluations
+        self.last_time = now
+        # Simulert annealing rapporterer nåværende avstand, ikke beste
+        self._record(metrics.get("best_distance", metrics.get("distance")))
+
+    def on_end(self, metrics):
+        super().on_end(metrics)
+        self._record(metrics.get("best_distance"))
+
+    def loop_statistics(self) -> Tuple[Optional[float], Optional[float]]:
+        # Sekunder per generasjon og evalueringer per sekund i generasjonsløkka
+        if self.first_time is None or self.generations == self.first_generation:
+            return None, None
+        seconds = self.last_time - self.first_time
+        evaluations = self.evaluations - self.first_evaluations
+        return (
+            seconds / (self.generations - self.first_generation),
+            evaluations / seconds if seconds > 0 else None,
+        )
+
+
+def tsp_environment(num_cities: int):
+    return initialize_random_environment(num_cities, seed=SEED + num_cities)
+
+
+def vrp_environment(num_cities: int, num_vehicles: int):
+    capacity = math.ceil(num_cities / num_vehicles) + 2
+    return Environment(num_cities, num_vehicles, capacity, seed=SEED + num_cities)
+
+
+def run_tsp_hc(environment, generations: int, observers: List[Observer]) -> None:
+    tsp_hc.solve(
+        environment,
+        generations,
+        generations // 10,
+        False,
+        headless=True,
+        observers=observers,
+    )
+
+
+def run_tsp_sa(environment, generations: int, observers: List[Observer]) -> None:
+    tsp_sa.solve(
+        environment,
+        generations,
+        generations // 10,
+        show_plots=False,
+        temperature_function=tsp_sa.linear_decay(100, 100 / generations),
+        headless=True,
+        observers=observers,
+    )
+
+
+def run_tsp_ga(environment, generations: int, observers: List[Observer]) -> None:
+    tsp_ga.solve(
+        environment,
+        population_size=TSP_GA_POPULATION,
+        elite_size=5,
+        mutation_rate=0.05,
+        generations=generations,
+        eval_frequency=generations // 10,
+        show_plots=False,
+        headless=True,
+        observers=observers,
+    )
+
+
+def run_vrp_ga(environment, generations: int, observers: List[Observer]) -> None:
+    vrp_ga.solve(
+        environment,
+        population_size=VRP_GA_POPULATION,
+        elite_size=3,
+        mutation_rate=0.05,
+        generations=generations,
+        eval_frequency=generations // 10,
+        show_plots=False,
+        headless=True,
+        observers=observers,
+    )
+
+
+def run_vrp_me(environment, generations: int, observers: List[Observer]) -> None:
+    vrp_me.solve(
+        environment,
+        steps=generations,
+        mutation_rate=0.05,
+        eval_frequency=generations // 10,
+        num_cars_dimension_size=environment.num_vehicles,
+        average_route_length_dimension_size=10,
+        max_average_route_length=3000,
+        seed=SEED,
+        headless=True,
+        observers=observers,
+    )
+
+
+SOLVERS: Dict[str, Tuple[str, Callable]] = {
+    "tsp_hc": ("tsp", run_tsp_hc),
+    "tsp_sa": ("tsp", run_tsp_sa),
+    "tsp_ga": ("tsp", run_tsp_ga),
+    "vrp_ga": ("vrp", run_vrp_ga),
+    "vrp_me": ("vrp", run_vrp_me),
+}
+
+
+def run_once(run: Callable, environment, generations: int, measure_memory: bool):
+    random.seed(SEED)
+    np.random.seed(SEED)
+
+    if measure_memory:
+        tracemalloc.start()
+    recorder = BenchmarkRecorder()
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run(environment, generations, [recorder])
+        seconds = time.perf_counter() - start
+    finally:
+        peak = tracemalloc.get_traced_memory()[1] if measure_memory else None
+        if measure_memory:
+            tracemalloc.stop()
+
+    return recorder, seconds, peak
+
+
+def benchmark(
+    solver: str,
+    instance: Union[str, Tuple[int, ...]],
+    generations: int,
+    measure_memory: bool,
+    repeats: int = 3,
+) -> dict:
+    # En instans er enten en størrelse på en tilfeldig instans, eller stien
+    # til en TSPLIB-/CVRPLIB-fil
+    problem, run = SOLVERS[solver]
+    if isinstance(instance, str):
+        load = load_tsplib if problem == "tsp" else load_cvrplib
+        environment = load(instance)
+        name = f"{solver}/{os.path.splitext(os.path.basename(instance))[0]}"
+    elif problem == "tsp":
+        environment = tsp_environment(*instance)
+        name = f"{solver}/{instance[0]}"
+    else:
+        environment = vrp_environment(*instance)
+        name = f"{solver}/{instance[0]}x{instance[1]}"
+
+    result = {
+        "name": name,
+        "solver": solver,
+        "instance": instance if isinstance(instance, str) else list(instance),
+        "seed": SEED,
+        "generations": generations,
+        "repeats": repeats,
+        "error": None,
+    }
+
+    # Avstandsmatrisen regnes ut før tidtakingen starter
+    environment.distance_matrix
+
+    # Tiden måles uten tracemalloc, som ellers ville gjort kjøringen tregere.
+    # Medianen av flere kjøringer brukes, for å dempe støy.
+    try:
+        runs = [run_once(run, environment, generations, False) for _ in range(repeats)]
+        peak = None
+        if measure_memory:
+            peak = run_once(run, environment, generations, True)[2]
+    except Exception as e:
+        # Løsere med uferdige TODO-er feiler; det registreres i stedet for å
+        # stoppe hele kjøringen
+        result["error"] = f"{type(e).__name__}: {e}"
+        return result
+
+    # Kjøringene er seedet og gir samme kurve, så kurven tas fra kjøringen med
+    # mediantiden
+    recorder, seconds, _ = sorted(runs, key=lambda x: x[1])[len(runs) // 2]
+    loop_statistics = [x[0].loop_statistics() for x in runs]
+    result.update(
+        evaluations=recorder.evaluations,
+        seconds=seconds,
+        seconds_per_generation=median([x[0] for x in loop_statistics]),
+        evaluations_per_second=median([x[1] for x in loop_statistics]),
+        peak_memory_bytes=peak,
+        best_distance=recorder.curve[-1][1] if recorder.curve else None,
+        curve=recorder.curve,
+    )
+    return result
+
+
+def median(values: List[Optional[float]]) -> Optional[float]:
+    values = [x for x in values if x is not None]
+    return float(np.median(values)) if values else None
+
+
+def compare(
+    results: List[dict],
+    baseline: dict,
+    time_tolerance: float,
+    distance_tolerance: float,
+) -> List[str]:
+    previous = {x["name"]: x for x in baseline["results"]}
+    regressions = []
+
+    print(f"{'benchmark':<18} {'s/gen':>10} {'baseline':>10} {'ratio':>7}")
+    for result in results:
+        old = previous.get(result["name"])
+        if old is None or result["error"] or old["error"]:
+            continue
+
+        if result["seconds_per_generation"] and old["seconds_per_generation"]:
+            ratio = result["seconds_per_generation"] / old["seconds_per_generation"]
+            print(
+                f"{result['name']:<18} {result['seconds_per_generation']:>10.2e} "
+                f"{old['seconds_per_generation']:>10.2e} {ratio:>7.2f}"
+            )
+            if ratio > 1 + time_tolerance:
+                regressions.append(f"{result['name']}: {ratio:.2f}x slower")
+
+        # Løsere som ikke rapporterer noen avstand kan ikke sammenlignes
+        if result["best_distance"] is None or old["best_distance"] is None:
+            continue
+        if result["best_distance"] > old["best_distance"] * (1 + distance_tolerance):
+            regressions.append(
+                f"{result['name']}: best distance {result['best_distance']:.1f} "
+                f"vs {old['best_distance']:.1f}"
+            )
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Kjører løserne på faste instanser og skriver resultatene som JSON"
+    )
+    parser.add_argument("--solvers", nargs="+", choices=list(SOLVERS), default=None)
+    parser.add_argument("--tsp-sizes", nargs="+", type=int, default=TSP_SIZES)
+    parser.add_argument(
+        "--vrp-instances",
+        nargs="+",
+        default=[f"{c}x{v}" for c, v in VRP_INSTANCES],
+        help="Instanser på formen <byer>x<biler>",
+    )
+    parser.add_argument(
+        "--instances",
+        nargs="+",
+        default=[],
+        help="TSPLIB- (.tsp) og CVRPLIB-filer (.vrp) som kjøres i tillegg",
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        default=1.0,
+        help="Skalerer antall generasjoner for alle løserne",
+    )
+    parser.add_argument(
+        "--repeats",
+        type=int,
+        default=3,
+        help="Antall tidsmålte kjøringer per instans; medianen brukes",
+    )
+    parser.add_argument("--no-memory", action="store_true")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", help="Tidligere resultater å sammenligne med")
+    # Tidene varierer mye mer mellom kjøringer enn avstandene, som er seedet
+    parser.add_argument(
+        "--time-tolerance",
+        type=float,
+        default=0.5,
+        help="Hvor mye tregere per generasjon enn baseline som godtas",
+    )
+    parser.add_argument(
+        "--distance-tolerance",
+        type=float,
+        default=0.1,
+        help="Hvor mye lengre beste avstand enn baseline som godtas",
+    )
+    return parser.parse_args()
+
+
+def main():
+    arguments = parse_arguments()
+    vrp_instances = [
+        tuple(int(x) for x in instance.split("x"))
+        for instance in arguments.vrp_instances
+    ]
+
+    results = []
+    for solver in arguments.solvers or list(SOLVERS):
+        problem, _ = SOLVERS[solver]
+        instances = (
+            [(size,) for size in arguments.tsp_sizes]
+            if problem == "tsp"
+            else vrp_instances
+        )
+        instances = instances + [
+            path for path in arguments.instances if path.endswith(f".{problem}")
+        ]
+        generations = max(int(GENERATIONS[solver] * arguments.scale), 10)
+        for instance in instances:
+            result = benchmark(
+                solver,
+                instance,
+                generations,
+                not arguments.no_memory,
+                arguments.repeats,
+            )
+            results.append(result)
+            if result["error"]:
+                print(f"{result['name']:<18} error: {result['error']}")
+            else:
+                print(
+                    f"{result['name']:<18} {result['seconds']:8.2f} s "
+                    f"{result['evaluations_per_second'] or 0:12.0f} evals/s "
+                    f"best {result['best_distance'] or float('nan'):.1f}"
+                )
+
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "scale": arguments.scale,
+        "results": results,
+    }
+    with open(arguments.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {arguments.output}")
+
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(
+            results,
+            baseline,
+            arguments.time_tolerance,
+            arguments.distance_tolerance,
+        )
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+from typing import Callable, Tuple
+
+import numpy as np
+
+from .plotting import pyplot
+
+
+class FrameWriter:
+    def __init__(
+        self, path: str, fps: int = 5, figsize: Tuple[float, float] = (15, 10)
+    ) -> None:
+        import imageio
+
+        # Hver frame tegnes på samme figur og skrives rett til fil (GIF eller
+        # MP4), så ingen historikk trenger å ligge i minnet
+        self.writer = imageio.get_writer(path, mode="I", fps=fps)
+        self.figure = pyplot().figure(figsize=figsize)
+        self.frames = 0
+
+    def append(self, draw: Callable[[object], None]) -> None:
+        self.figure.clf()
+        draw(self.figure)
+        self.figure.canvas.draw()
+        frame = np.asarray(self.figure.canvas.buffer_rgba())[..., :3]
+        self.writer.append_data(frame)
+        self.frames += 1
+
+    def close(self) -> None:
+        self.writer.close()
+        pyplot().close(self.figure)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
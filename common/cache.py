@@ -0,0 +1,87 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+
+def canonical_route_key(route: Sequence[int]) -> bytes:
+    # Rotasjoner og reverseringer av en tur gir samme nøkkel. Nøkkelen lagres
+    # som int32, uansett hvilken type ruta har.
+    route = np.asarray(route, dtype=np.int32)
+    rotated = np.roll(route, -int(np.argmin(route)))
+    if len(rotated) > 2 and rotated[-1] < rotated[1]:
+        rotated = np.concatenate((rotated[:1], rotated[:0:-1]))
+    return rotated.tobytes()
+
+
+def canonical_chromosome_key(chromosome: Sequence[int]) -> bytes:
+    # Rekkefølgen på bilene og retningen på hver rute påvirker ikke fitness.
+    # De kanoniske rutene pakkes som int32 med -1 mellom, som tar langt mindre
+    # plass i cachen enn tupler av Python-heltall.
+    routes: List[List[int]] = [[]]
+    for gene in chromosome:
+        if gene < 0:
+            routes.append([])
+        else:
+            routes[-1].append(int(gene))
+    canonical = sorted(min(r, r[::-1]) for r in routes)
+    key = [gene for route in canonical for gene in route + [-1]]
+    return np.asarray(key, dtype=np.int32).tobytes()
+
+
+class EvaluationCache:
+    # Løserne bruker ingen cache som standard. Populasjonene evalueres
+    # vektorisert, og da koster nøklene mer enn evalueringene cachen sparer.
+    def __init__(
+        self,
+        capacity: int = 10000,
+        key_function: Callable[[Sequence[int]], Hashable] = canonical_route_key,
+    ) -> None:
+        self.capacity = capacity
+        self.key_function = key_function
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups > 0 else 0.0
+
+    def get(self, solution: Sequence[int]) -> Optional[float]:
+        return self.get_key(self.key_function(solution))
+
+    def put(self, solution: Sequence[int], value: float) -> None:
+        self.put_key(self.key_function(solution), value)
+
+    # Nøkkelen kan lages én gang og brukes både til oppslag og lagring
+    def get_key(self, key: Hashable) -> Optional[float]:
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+        self.misses += 1
+        return None
+
+    def put_key(self, key: Hashable, value: float) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+    def get_or_compute(
+        self, solution: Sequence[int], compute: Callable[[Sequence[int]], float]
+    ) -> float:
+        value = self.get(solution)
+        if value is None:
+            value = compute(solution)
+            self.put(solution, value)
+        return value
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,104 @@
+import json
+import os
+import random
+import shutil
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+META_FILE = "meta.json"
+
+
+def capture_random_state() -> Tuple[Dict[str, np.ndarray], dict]:
+    version, internal_state, gauss = random.getstate()
+    _, keys, position, has_gauss, cached_gaussian = np.random.get_state()
+
+    arrays = {
+        "random_state": np.array(internal_state, dtype=np.int64),
+        "numpy_random_state": keys,
+    }
+    meta = {
+        "random_version": version,
+        "random_gauss": gauss,
+        "numpy_random_position": int(position),
+        "numpy_random_has_gauss": int(has_gauss),
+        "numpy_random_cached_gaussian": float(cached_gaussian),
+    }
+    return arrays, meta
+
+
+def restore_random_state(arrays: Dict[str, np.ndarray], meta: dict) -> None:
+    random.setstate(
+        (
+            meta["random_version"],
+            tuple(int(x) for x in arrays["random_state"]),
+            meta["random_gauss"],
+        )
+    )
+    np.random.set_state(
+        (
+            "MT19937",
+            np.asarray(arrays["numpy_random_state"]),
+            meta["numpy_random_position"],
+            meta["numpy_random_has_gauss"],
+            meta["numpy_random_cached_gaussian"],
+        )
+    )
+
+
+def save_checkpoint(
+    path: str, arrays: Dict[str, np.ndarray], meta: dict, random_state: bool = True
+) -> None:
+    # Skriver til en midlertidig mappe og bytter den inn til slutt, så et
+    # avbrudd midt i skrivingen aldri ødelegger forrige sjekkpunkt
+    path = os.path.abspath(path)
+    temporary_path = f"{path}.tmp"
+    previous_path = f"{path}.old"
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    os.makedirs(temporary_path)
+
+    random_arrays, random_meta = capture_random_state() if random_state else ({}, {})
+    for name, array in {**arrays, **random_arrays}.items():
+        np.save(os.path.join(temporary_path, f"{name}.npy"), np.asarray(array))
+    with open(os.path.join(temporary_path, META_FILE), "w") as f:
+        json.dump({**meta, **random_meta}, f)
+
+    shutil.rmtree(previous_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, previous_path)
+    os.rename(temporary_path, path)
+    shutil.rmtree(previous_path, ignore_errors=True)
+
+
+def load_checkpoint(
+    path: str, restore_random: bool = True
+) -> Optional[Tuple[Dict[str, np.ndarray], dict]]:
+    # Faller tilbake på forrige sjekkpunkt dersom vi ble avbrutt under byttet
+    path = os.path.abspath(path)
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        path = f"{path}.old"
+        if not os.path.exists(os.path.join(path, META_FILE)):
+            return None
+
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+
+    # Arrayene minnemappes (copy-on-write), så innlastingen går fort også for
+    # store arkiver, og bare det som faktisk leses hentes fra disk
+    arrays = {
+        name[: -len(".npy")]: np.load(os.path.join(path, name), mmap_mode="c")
+        for name in os.listdir(path)
+        if name.endswith(".npy")
+    }
+
+    if restore_random:
+        restore_random_state(arrays, meta)
+
+    return arrays, meta
+
+
+def check_coordinates(arrays: Dict[str, np.ndarray], coordinates: np.ndarray) -> None:
+    if "coordinates" in arrays and not np.array_equal(
+        arrays["coordinates"], coordinates
+    ):
+        raise ValueError("The checkpoint was made for a different environment")
@@ -0,0 +1,11 @@
+import numpy as np
+
+
+def smallest_int_dtype(low: int, high: int) -> np.dtype:
+    # Minste heltallstype som rommer alle genene. En rute med under 32768 byer
+    # får plass i int16, en fjerdedel av int64.
+    for dtype in (np.int16, np.int32):
+        info = np.iinfo(dtype)
+        if info.min <= low and high <= info.max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
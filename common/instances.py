@@ -0,0 +1,241 @@
+import itertools
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from .checkpoint import load_checkpoint, save_checkpoint
+
+EDGE_WEIGHT_TYPES = ("EUC_2D", "CEIL_2D", "ATT", "GEO")
+NUM_NEIGHBOURS = 10
+
+CHUNK_LINES = 65536
+
+
+def _keyword(line: str) -> Tuple[str, str]:
+    key, _, value = line.partition(":")
+    return key.strip().upper(), value.strip()
+
+
+def _is_section(key: str) -> bool:
+    return key.endswith("_SECTION") or key == "EOF"
+
+
+def _parse_header(f) -> Tuple[dict, Optional[str]]:
+    # Nøkkel : verdi-linjer fram til første seksjon
+    header = {}
+    for line in f:
+        if not line.strip():
+            continue
+        key, value = _keyword(line)
+        if _is_section(key):
+            return header, key
+        header[key] = value
+    return header, None
+
+
+def _next_section(f) -> Optional[str]:
+    # Hopper over innholdet i seksjoner som ikke brukes
+    for line in f:
+        key, _ = _keyword(line)
+        if _is_section(key):
+            return key
+    return None
+
+
+def _read_rows(f, rows: int, columns: int) -> np.ndarray:
+    # Leser tallene i blokker på CHUNK_LINES linjer, så bare én blokk med
+    # tekst er i minnet om gangen, og hver blokk tolkes direkte av NumPy
+    values = np.empty((rows, columns))
+    filled = 0
+    while filled < rows:
+        lines = list(itertools.islice(f, min(CHUNK_LINES, rows - filled)))
+        if not lines:
+            break
+        text = "".join(line for line in lines if line.strip())
+        if not text:
+            continue
+        chunk = np.fromstring(text, sep=" ").reshape(-1, columns)
+        values[filled : filled + len(chunk)] = chunk
+        filled += len(chunk)
+    return values[:filled]
+
+
+def _read_depots(f) -> np.ndarray:
+    # Depotlista avsluttes med -1
+    depots = []
+    for line in f:
+        for value in line.split():
+            if int(value) < 0:
+                return np.asarray(depots, dtype=np.intp)
+            depots.append(int(value))
+    return np.asarray(depots, dtype=np.intp)
+
+
+def parse_instance(path: str) -> Tuple[Dict[str, np.ndarray], dict]:
+    with open(path) as f:
+        header, section = _parse_header(f)
+
+        edge_weight_type = header.get("EDGE_WEIGHT_TYPE", "EUC_2D").upper()
+        if edge_weight_type not in EDGE_WEIGHT_TYPES:
+            raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE: {edge_weight_type}")
+        dimension = int(header["DIMENSION"])
+
+        # Seksjonene leses i den rekkefølgen de står i fila
+        sections = {}
+        while section not in (None, "EOF"):
+            if section == "NODE_COORD_SECTION":
+                sections[section] = _read_rows(f, dimension, 3)
+            elif section == "DEMAND_SECTION":
+                sections[section] = _read_rows(f, dimension, 2)
+            elif section == "DEPOT_SECTION":
+                sections[section] = _read_depots(f)
+            section = _next_section(f)
+
+    if "NODE_COORD_SECTION" not in sections:
+        raise ValueError(f"{path} has no NODE_COORD_SECTION")
+
+    nodes = sections["NODE_COORD_SECTION"]
+    if len(nodes) != dimension:
+        raise ValueError(f"Expected {dimension} nodes, found {len(nodes)}")
+
+    # Nodene nummereres fra 1 i filene
+    arrays = {"coordinates": np.empty((dimension, 2))}
+    arrays["coordinates"][nodes[:, 0].astype(np.intp) - 1] = nodes[:, 1:]
+
+    if "DEMAND_SECTION" in sections:
+        demands = sections["DEMAND_SECTION"]
+        arrays["demands"] = np.zeros(dimension, dtype=np.int64)
+        arrays["demands"][demands[:, 0].astype(np.intp) - 1] = demands[:, 1]
+
+    if "DEPOT_SECTION" in sections:
+        depots = sections["DEPOT_SECTION"]
+        arrays["depots"] = depots[depots > 0] - 1
+
+    meta = {
+        "name": header.get("NAME", os.path.basename(path)),
+        "type": header.get("TYPE", "TSP").upper(),
+        "dimension": dimension,
+        "edge_weight_type": edge_weight_type,
+    }
+    if "CAPACITY" in header:
+        meta["capacity"] = int(header["CAPACITY"])
+
+    # CVRPLIB oppgir antall biler enten som VEHICLES eller i navnet (A-n32-k5)
+    vehicles = re.search(r"-k(\d+)", meta["name"])
+    if "VEHICLES" in header:
+        meta["vehicles"] = int(header["VEHICLES"])
+    elif vehicles is not None:
+        meta["vehicles"] = int(vehicles.group(1))
+
+    return arrays, meta
+
+
+def nearest_neighbour_lists(coordinates: np.ndarray, k: int) -> np.ndarray:
+    from scipy.spatial import cKDTree
+
+    k = min(k, len(coordinates) - 1)
+    _, neighbours = cKDTree(coordinates).query(coordinates, k + 1)
+    neighbours = neighbours.reshape(len(coordinates), -1)
+
+    # Fjerner byen selv fra lista, uten å anta at den alltid står først
+    # (duplikate punkter kan komme i vilkårlig rekkefølge)
+    others = neighbours != np.arange(len(coordinates))[:, np.newaxis]
+    order = np.argsort(~others, axis=1, kind="stable")[:, :k]
+    return np.take_along_axis(neighbours, order, axis=1)
+
+
+def load_instance(
+    path: str, num_neighbours: int = NUM_NEIGHBOURS
+) -> Tuple[Dict[str, np.ndarray], dict]:
+    # Tolket instans og nabolister lagres i en mappe ved siden av fila og
+    # minnemappes ved neste innlasting, så lenge kildefila er uendret
+    cache_path = f"{path}.cache"
+    stat = os.stat(path)
+    source = {"source_size": stat.st_size, "source_mtime": stat.st_mtime_ns}
+
+    cached = load_checkpoint(cache_path, restore_random=False)
+    if cached is not None:
+        arrays, meta = cached
+        fresh = all(meta.get(key) == value for key, value in source.items())
+        if fresh and meta.get("num_neighbours", 0) >= num_neighbours:
+            if "neighbours" in arrays:
+                arrays["neighbours"] = arrays["neighbours"][:, :num_neighbours]
+            return arrays, meta
+
+    arrays, meta = parse_instance(path)
+    if num_neighbours > 0:
+        arrays["neighbours"] = nearest_neighbour_lists(
+            arrays["coordinates"], num_neighbours
+        )
+    meta.update(source, num_neighbours=num_neighbours)
+
+    try:
+        save_checkpoint(cache_path, arrays, meta, random_state=False)
+    except OSError:
+        # Skrivebeskyttede mapper gir bare ingen cache
+        pass
+
+    return arrays, meta
+
+
+def _nint(x: np.ndarray) -> np.ndarray:
+    return np.floor(x + 0.5)
+
+
+def _geo_radians(coordinates: np.ndarray) -> np.ndarray:
+    # TSPLIB lagrer GEO-koordinater som grader.minutter
+    degrees = np.trunc(coordinates)
+    minutes = coordinates - degrees
+    return 3.141592 * (degrees + 5.0 * minutes / 3.0) / 180.0
+
+
+def geo_points(coordinates: np.ndarray) -> np.ndarray:
+    # GEO-koordinater som punkter på enhetskula. Nærmeste punkt i rommet er
+    # også nærmest langs kula, så KD-trær kan brukes på disse punktene.
+    latitude, longitude = _geo_radians(coordinates).T
+    return np.stack(
+        (
+            np.cos(latitude) * np.cos(longitude),
+            np.cos(latitude) * np.sin(longitude),
+            np.sin(latitude),
+        ),
+        axis=1,
+    )
+
+
+def tsplib_distances(a: np.ndarray, b: np.ndarray, edge_weight_type: str) -> np.ndarray:
+    # Avstandene avrundes som i TSPLIB, slik at rutelengdene kan sammenlignes
+    # direkte med kjente optima. a og b kringkastes mot hverandre.
+    if edge_weight_type == "GEO":
+        a, b = _geo_radians(a), _geo_radians(b)
+        q1 = np.cos(a[..., 1] - b[..., 1])
+        q2 = np.cos(a[..., 0] - b[..., 0])
+        q3 = np.cos(a[..., 0] + b[..., 0])
+        cosine = np.clip(0.5 * ((1.0 + q1) * q2 - (1.0 - q1) * q3), -1.0, 1.0)
+        return np.trunc(6378.388 * np.arccos(cosine) + 1.0)
+
+    dx = a[..., 0] - b[..., 0]
+    dy = a[..., 1] - b[..., 1]
+    if edge_weight_type == "ATT":
+        r = np.sqrt((dx * dx + dy * dy) / 10.0)
+        t = _nint(r)
+        return np.where(t < r, t + 1.0, t)
+
+    distances = np.hypot(dx, dy)
+    if edge_weight_type == "CEIL_2D":
+        return np.ceil(distances)
+    if edge_weight_type == "EUC_2D":
+        return _nint(distances)
+    raise ValueError(f"Unsupported EDGE_WEIGHT_TYPE: {edge_weight_type}")
+
+
+def tsplib_distance_matrix(
+    coordinates: np.ndarray, edge_weight_type: str
+) -> np.ndarray:
+    distances = tsplib_distances(
+        coordinates[:, np.newaxis], coordinates[np.newaxis, :], edge_weight_type
+    )
+    np.fill_diagonal(distances, 0.0)
+    return distances
@@ -0,0 +1,166 @@
+import queue
+import random
+import traceback
+from multiprocessing import Process, Queue
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+TOPOLOGIES = ("ring", "random")
+
+# Sekunder en øy venter på innvandrere før den gir opp, og hvor ofte
+# hovedprosessen sjekker om noen av øyene har dødd
+MIGRATION_TIMEOUT = 300.0
+POLL_INTERVAL = 1.0
+
+
+def migration_target(index: int, num_islands: int, topology: str, seed: int) -> int:
+    if topology == "ring":
+        return (index + 1) % num_islands
+    elif topology == "random":
+        # Alle øyene trekker samme tilfeldige ring, så hver øy får nøyaktig
+        # én gruppe innvandrere per migrasjon
+        order = list(range(num_islands))
+        random.Random(seed).shuffle(order)
+        return order[(order.index(index) + 1) % num_islands]
+    raise ValueError(f"Unknown topology: {topology}")
+
+
+def _run_island(
+    index: int,
+    initialize: Callable[[], list],
+    step: Callable[[list], list],
+    rank: Callable[[list], Tuple[np.ndarray, np.ndarray]],
+    generations: int,
+    migration_interval: int,
+    migration_size: int,
+    topology: str,
+    seed: int,
+    inboxes: List[Queue],
+    results: Queue,
+    timeout: float,
+) -> None:
+    random.seed(seed + index)
+    np.random.seed(seed + index)
+
+    # Innvandrere fra en senere migrasjon kan komme før dem denne øya venter
+    # på, siden avsenderen skifter fra gang til gang. De legges til side til
+    # øya kommer dit.
+    pending = {}
+
+    try:
+        population = initialize()
+        for g in range(generations):
+            population = step(population)
+
+            if len(inboxes) > 1 and (g + 1) % migration_interval == 0:
+                _, order = rank(population)
+                migrants = [population[i] for i in order[:migration_size]]
+                epoch = seed + (g + 1) // migration_interval
+                target = migration_target(index, len(inboxes), topology, epoch)
+                inboxes[target].put((epoch, index, migrants))
+
+                while epoch not in pending:
+                    received, source, batch = inboxes[index].get(timeout=timeout)
+                    pending[received] = (source, batch)
+                source, immigrants = pending.pop(epoch)
+                if migration_target(source, len(inboxes), topology, epoch) != index:
+                    raise RuntimeError(
+                        f"Island {index} got migrants meant for another island "
+                        f"from island {source}"
+                    )
+
+                # Innvandrerne erstatter de dårligste løsningene på øya
+                for i, immigrant in zip(order[::-1], immigrants):
+                    population[i] = immigrant
+
+        distances, order = rank(population)
+        results.put((index, float(distances[order[0]]), population[order[0]]))
+    except Exception:
+        # Avstanden None betyr at øya feilet, og feilmeldingen sendes i stedet
+        # for løsningen
+        results.put((index, None, traceback.format_exc()))
+
+
+def _collect_results(processes: List[Process], results: Queue) -> list:
+    island_results = {}
+    while len(island_results) < len(processes):
+        # Øyer som dør uten å melde fra (f.eks. drept av systemet) gir ingen
+        # melding på køen. En øy som var avsluttet før ventingen startet, har
+        # rukket å levere resultatet sitt hvis den hadde et.
+        exited = [process.exitcode is not None for process in processes]
+        try:
+            index, distance, solution = results.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            for index, process in enumerate(processes):
+                if exited[index] and index not in island_results:
+                    raise RuntimeError(
+                        f"Island {index} exited with code {process.exitcode} "
+                        "without a result"
+                    )
+            continue
+
+        if distance is None:
+            raise RuntimeError(f"Island {index} failed:\n{solution}")
+        island_results[index] = (distance, solution)
+
+    # Sorteres etter øy, så like avstander ikke avgjøres av hvem som ble først ferdig
+    return [island_results[index] for index in sorted(island_results)]
+
+
+def run_islands(
+    initialize: Callable[[], list],
+    step: Callable[[list], list],
+    rank: Callable[[list], Tuple[np.ndarray, np.ndarray]],
+    generations: int,
+    islands: int,
+    migration_interval: int = 10,
+    migration_size: int = 2,
+    topology: str = "ring",
+    seed: Optional[int] = None,
+    timeout: float = MIGRATION_TIMEOUT,
+) -> Tuple[float, list]:
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology: {topology}")
+    if seed is None:
+        seed = random.randrange(2**31)
+
+    inboxes = [Queue() for _ in range(islands)]
+    results = Queue()
+    processes = [
+        Process(
+            target=_run_island,
+            args=(
+                i,
+                initialize,
+                step,
+                rank,
+                generations,
+                migration_interval,
+                migration_size,
+                topology,
+                seed,
+                inboxes,
+                results,
+                timeout,
+            ),
+        )
+        for i in range(islands)
+    ]
+    for process in processes:
+        process.start()
+
+    # Resultatene må hentes før join, ellers kan prosessene henge på køen.
+    # Feiler én øy, stoppes de andre i stedet for å vente på innvandrere.
+    try:
+        island_results = _collect_results(processes, results)
+    except BaseException:
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+
+    distance, solution = min(island_results, key=lambda result: result[0])
+    return distance, solution
@@ -0,0 +1,195 @@
+import csv
+import json
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+
+class Observer:
+    def on_start(self, solver: str, config: Dict[str, object]) -> None:
+        pass
+
+    def on_phase(self, phase: str, seconds: float) -> None:
+        pass
+
+    def on_generation(self, generation: int, metrics: Dict[str, float]) -> None:
+        pass
+
+    def on_end(self, metrics: Dict[str, float]) -> None:
+        pass
+
+
+class ObserverGroup(Observer):
+    def __init__(self, observers: List[Observer]) -> None:
+        self.observers = observers
+
+    def on_start(self, solver, config):
+        for observer in self.observers:
+            observer.on_start(solver, config)
+
+    def on_phase(self, phase, seconds):
+        for observer in self.observers:
+            observer.on_phase(phase, seconds)
+
+    def on_generation(self, generation, metrics):
+        for observer in self.observers:
+            observer.on_generation(generation, metrics)
+
+    def on_end(self, metrics):
+        for observer in self.observers:
+            observer.on_end(metrics)
+
+
+def combine(observers: Optional[List[Observer]]) -> Optional[Observer]:
+    # Uten observatører returneres None, slik at løserne kan hoppe over all
+    # tidtaking og statistikk
+    if not observers:
+        return None
+    if len(observers) == 1:
+        return observers[0]
+    return ObserverGroup(list(observers))
+
+
+def timed(observer: Optional[Observer], phase: str, function: Callable, *args):
+    if observer is None:
+        return function(*args)
+
+    start = time.perf_counter()
+    result = function(*args)
+    observer.on_phase(phase, time.perf_counter() - start)
+    return result
+
+
+def diversity(population) -> float:
+    # Andelen unike individer i populasjonen
+    population = np.asarray(population)
+    return len(np.unique(population, axis=0)) / len(population)
+
+
+class Counter(Observer):
+    def __init__(self) -> None:
+        self.solver = None
+        self.phase_seconds = defaultdict(float)
+        self.phase_calls = defaultdict(int)
+        self.generations = 0
+        self.evaluations = 0
+        self.last_metrics = {}
+        self.start_time = None
+        self.seconds = None
+
+    def on_start(self, solver, config):
+        self.solver = solver
+        self.start_time = time.perf_counter()
+
+    def on_phase(self, phase, seconds):
+        self.phase_seconds[phase] += seconds
+        self.phase_calls[phase] += 1
+
+    def on_generation(self, generation, metrics):
+        self.generations = generation
+        self.evaluations += metrics.get("evaluations", 0)
+        self.last_metrics = metrics
+
+    def on_end(self, metrics):
+        self.seconds = time.perf_counter() - self.start_time
+        self.last_metrics = {**self.last_metrics, **metrics}
+
+    def summary(self) -> Dict[str, object]:
+        return {
+            **self.last_metrics,
+            "solver": self.solver,
+            "seconds": self.seconds,
+            "generations": self.generations,
+            "evaluations": self.evaluations,
+            "evaluations_per_second": (
+                self.evaluations / self.seconds if self.seconds else None
+            ),
+            "phases": {
+                phase: {"seconds": seconds, "calls": self.phase_calls[phase]}
+                for phase, seconds in self.phase_seconds.items()
+            },
+        }
+
+    def report(self) -> None:
+        summary = self.summary()
+        print(f"{summary['solver']}: {summary['seconds']:.2f} s", end="")
+        print(f", {summary['generations']} generations", end="")
+        print(f", {summary['evaluations']} evaluations")
+        total = sum(self.phase_seconds.values()) or 1.0
+        for phase, seconds in sorted(
+            self.phase_seconds.items(), key=lambda x: x[1], reverse=True
+        ):
+            print(f"  {phase:<12} {seconds:9.3f} s {100 * seconds / total:6.1f} %")
+
+
+class StreamLogger(Observer):
+    def __init__(self, path: str, every: int = 1) -> None:
+        # Formatet velges fra filendelsen: .csv gir CSV, ellers JSON Lines
+        self.path = path
+        self.every = every
+        self.file = open(path, "w+", newline="")
+        self.csv = path.endswith(".csv")
+        self.writer = None
+        self.phase_seconds = defaultdict(float)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        self.file.close()
+
+    def on_phase(self, phase, seconds):
+        self.phase_seconds[phase] += seconds
+
+    def on_generation(self, generation, metrics):
+        if generation % self.every != 0:
+            return
+
+        row = {"generation": generation, **metrics}
+        row.update((f"{k}_seconds", v) for k, v in self.phase_seconds.items())
+        self.phase_seconds.clear()
+
+        if self.csv:
+            self._write_csv_row(row)
+        else:
+            self.file.write(json.dumps(row) + "\n")
+
+    def _write_csv_row(self, row) -> None:
+        fieldnames = self.writer.fieldnames if self.writer is not None else []
+        new_fields = [key for key in row if key not in fieldnames]
+        if new_fields:
+            # Nye kolonner dukker sjelden opp (f.eks. en fase som først kjøres
+            # senere), så da skrives fila på nytt med utvidet overskrift
+            self.file.seek(0)
+            rows = list(csv.DictReader(self.file))
+            self.file.seek(0)
+            self.file.truncate()
+            self.writer = csv.DictWriter(self.file, fieldnames=fieldnames + new_fields)
+            self.writer.writeheader()
+            self.writer.writerows(rows)
+
+        self.writer.writerow(row)
+
+    def on_end(self, metrics):
+        if not self.csv:
+            self.file.write(json.dumps({"end": True, **metrics}) + "\n")
+        self.close()
+
+
+def population_metrics(
+    distances, population, evaluations: int, cache=None
+) -> Dict[str, float]:
+    metrics = {
+        "best_distance": float(np.min(distances)),
+        "mean_distance": float(np.mean(distances)),
+        "diversity": diversity(population),
+        "evaluations": evaluations,
+    }
+    if cache is not None:
+        metrics["cache_hit_rate"] = cache.hit_rate
+    return metrics
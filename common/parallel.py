@@ -0,0 +1,108 @@
+from multiprocessing import Pool, resource_tracker
+from typing import Callable
+
+import numpy as np
+
+from .shared_memory import attach_shared_array, create_shared_array
+
+_worker_function = None
+_worker_environment = None
+_worker_arrays = {}
+
+
+def _initialize_worker(function, environment):
+    global _worker_function, _worker_environment
+    _worker_function = function
+    _worker_environment = environment
+
+
+def _attach(role, name, shape, dtype):
+    # Arbeiderne beholder koblingen til det delte minnet mellom generasjonene.
+    # Når hovedprosessen har laget et nytt segment, lukkes det gamle først.
+    if role in _worker_arrays and _worker_arrays[role][0] != name:
+        _, _, memory = _worker_arrays.pop(role)
+        memory.close()
+    if role not in _worker_arrays:
+        _worker_arrays[role] = (name, *attach_shared_array(name, shape, dtype))
+    return _worker_arrays[role][1]
+
+
+def _evaluate_chunk(task):
+    population_name, results_name, shape, dtype, start, stop = task
+    population = _attach("population", population_name, shape, dtype)
+    results = _attach("results", results_name, (shape[0],), np.float64)
+
+    results[start:stop] = _worker_function(population[start:stop], _worker_environment)
+
+
+class ParallelEvaluator:
+    def __init__(
+        self,
+        function: Callable[[np.ndarray, object], np.ndarray],
+        environment,
+        workers: int,
+    ) -> None:
+        # Miljøet (med avstandsmatrisen) sendes til arbeiderne én gang. Matrisen
+        # bygges først, ellers beregner hver arbeider den på nytt.
+        getattr(environment, "distance_matrix", None)
+        self.workers = workers
+        # Arbeiderne må dele ressurssporeren med hovedprosessen, ellers prøver
+        # hver av dem å rydde opp det delte minnet når de avsluttes
+        resource_tracker.ensure_running()
+        self.pool = Pool(
+            workers, initializer=_initialize_worker, initargs=(function, environment)
+        )
+        self._shape = None
+        self._dtype = None
+        self._memory = []
+
+    def _allocate(self, shape, dtype) -> None:
+        self._release()
+        self._population, population_memory = create_shared_array(shape, dtype)
+        self._results, results_memory = create_shared_array((shape[0],), np.float64)
+        self._memory = [population_memory, results_memory]
+        self._shape = shape
+        self._dtype = dtype
+
+    def _release(self) -> None:
+        for memory in self._memory:
+            memory.close()
+            memory.unlink()
+        self._memory = []
+
+    def evaluate(self, population: np.ndarray) -> np.ndarray:
+        population = np.asarray(population)
+        # Med cachen varierer antall individer fra generasjon til generasjon, så
+        # minnet beholdes så lenge populasjonen får plass
+        rows, columns = len(population), population.shape[1:]
+        if (
+            self._shape is None
+            or rows > self._shape[0]
+            or columns != self._shape[1:]
+            or population.dtype != self._dtype
+        ):
+            self._allocate(population.shape, population.dtype)
+
+        # Populasjonen skrives til delt minne, så ingenting pickles per generasjon
+        self._population[:rows] = population
+        bounds = np.linspace(0, rows, self.workers + 1).astype(int)
+        population_name, results_name = (memory.name for memory in self._memory)
+        tasks = [
+            (population_name, results_name, self._shape, self._dtype, start, stop)
+            for start, stop in zip(bounds[:-1], bounds[1:])
+            if stop > start
+        ]
+        self.pool.map(_evaluate_chunk, tasks)
+
+        return self._results[:rows].copy()
+
+    def close(self) -> None:
+        self.pool.terminate()
+        self.pool.join()
+        self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,15 @@
+_styled = False
+
+
+def pyplot():
+    # matplotlib og seaborn importeres først når noe faktisk skal plottes, slik
+    # at kjøringer uten plott starter raskt
+    global _styled
+    import matplotlib.pyplot as plt
+
+    if not _styled:
+        import seaborn as sns
+
+        sns.set()
+        _styled = True
+    return plt
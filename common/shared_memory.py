@@ -0,0 +1,19 @@
+from multiprocessing import shared_memory
+from typing import Tuple
+
+import numpy as np
+
+
+def create_shared_array(
+    shape: Tuple[int, ...], dtype
+) -> Tuple[np.ndarray, shared_memory.SharedMemory]:
+    size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+    memory = shared_memory.SharedMemory(create=True, size=size)
+    return np.ndarray(shape, dtype=dtype, buffer=memory.buf), memory
+
+
+def attach_shared_array(
+    name: str, shape: Tuple[int, ...], dtype
+) -> Tuple[np.ndarray, shared_memory.SharedMemory]:
+    memory = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=memory.buf), memory
@@ -1,27 +1,133 @@
-import sys
-from travelling_salesman.genetic_algorithm import main as tsp_ga
-from travelling_salesman.hill_climbing import main as tsp_hc
-from travelling_salesman.simulated_annealing import main as tsp_sa
+import argparse
+
+# Bare disse løserne kan lagre og fortsette fra sjekkpunkter
+CHECKPOINT_ALGORITHMS = ("ga", "genetic_algorithm", "me", "map-elites")
+# Øymodellen kjører i egne prosesser og rapporterer ikke til observatørene
+ISLAND_ALGORITHMS = ("islands", "island_model")
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "problem", choices=["tsp", "travelling_salesman", "vrp", "vehicle_routing"]
+    )
+    parser.add_argument("algorithm", nargs="?", default="ga")
+    parser.add_argument(
+        "--checkpoint",
+        help="Mappe der sjekkpunkter lagres underveis (GA og MAP-Elites)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Fortsett fra sjekkpunktet i --checkpoint dersom det finnes",
+    )
+    parser.add_argument(
+        "--headless",
+        action="store_true",
+        help="Kjør uten plott, slik at matplotlib aldri lastes",
+    )
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        help="Kjør med cProfile og skriv ut de tyngste funksjonene, eventuelt "
+        "også til en .prof-fil",
+    )
+    parser.add_argument(
+        "--log",
+        help="Skriv statistikk per generasjon til en CSV- eller JSONL-fil",
+    )
+    arguments = parser.parse_args()
+    if arguments.resume and arguments.checkpoint is None:
+        parser.error("--resume requires --checkpoint")
+    if (
+        arguments.checkpoint is not None
+        and arguments.algorithm not in CHECKPOINT_ALGORITHMS
+    ):
+        parser.error(f"--checkpoint is not supported by {arguments.algorithm}")
+    if arguments.algorithm in ISLAND_ALGORITHMS and arguments.log is not None:
+        parser.error("--log is not supported by the island model")
+    return arguments
+
+
+def run(arguments, observers):
+    checkpoint = dict(checkpoint_path=arguments.checkpoint, resume=arguments.resume)
+    options = dict(headless=arguments.headless, observers=observers)
+
+    # Løserne importeres først når de velges, så bare det som trengs blir lastet
+    if arguments.problem in ["tsp", "travelling_salesman"]:
+        if arguments.algorithm in ["hc", "hill_climbing"]:
+            from travelling_salesman.hill_climbing import main as tsp_hc
+
+            tsp_hc(**options)
+        elif arguments.algorithm in ["ga", "genetic_algorithm"]:
+            from travelling_salesman.genetic_algorithm import main as tsp_ga
+
+            tsp_ga(**checkpoint, **options)
+        elif arguments.algorithm in ["sa", "simulated_annealing"]:
+            from travelling_salesman.simulated_annealing import main as tsp_sa
+
+            tsp_sa(**options)
+        elif arguments.algorithm in ["sa_adaptive", "adaptive_annealing"]:
+            from travelling_salesman.simulated_annealing import main_adaptive
+
+            main_adaptive(**options)
+        elif arguments.algorithm in ["sa_chains", "parallel_tempering"]:
+            from travelling_salesman.simulated_annealing import main_chains
+
+            main_chains(**options)
+        elif arguments.algorithm in ["2opt", "ls", "local_search"]:
+            from travelling_salesman.local_search import main as tsp_ls
+
+            tsp_ls(**options)
+        elif arguments.algorithm in ISLAND_ALGORITHMS:
+            from travelling_salesman.genetic_algorithm import main_islands
+
+            main_islands(headless=arguments.headless)
+    elif arguments.problem in ["vrp", "vehicle_routing"]:
+        if arguments.algorithm in ["ga", "genetic_algorithm"]:
+            from vehicle_routing.genetic_algorithm import main as vrp_ga
+
+            vrp_ga(**checkpoint, **options)
+        elif arguments.algorithm in ["me", "map-elites"]:
+            from vehicle_routing.map_elites import main as vrp_me
+
+            vrp_me(**checkpoint, **options)
+        elif arguments.algorithm in ISLAND_ALGORITHMS:
+            from vehicle_routing.genetic_algorithm import main_islands
+
+            main_islands(headless=arguments.headless)
 
-from vehicle_routing.genetic_algorithm import main as vrp_ga
-from vehicle_routing.map_elites import main as vrp_me
 
 if __name__ == "__main__":
-    if sys.argv[1] in ["tsp", "travelling_salesman"]:
-        if len(sys.argv) > 2:
-            if sys.argv[2] in ["hc", "hill_climbing"]:
-                tsp_hc()
-            elif sys.argv[2] in ["ga", "genetic_algorithm"]:
-                tsp_ga()
-            elif sys.argv[2] in ["sa", "simulated_annealing"]:
-                tsp_sa()
-        else:
-            tsp_ga()
-    elif sys.argv[1] in ["vrp", "vehicle_routing"]:
-        if len(sys.argv) > 2:
-            if sys.argv[2] in ["ga", "genetic_algorithm"]:
-                vrp_ga()
-            elif sys.argv[2] in ["me", "map-elites"]:
-                vrp_me()
+    arguments = parse_arguments()
+
+    # Uten --log får løserne ingen observatører og kjører uten tidtaking
+    observers = []
+    logger = None
+    if arguments.log is not None:
+        from common.observers import Counter, StreamLogger
+
+        counter = Counter()
+        logger = StreamLogger(arguments.log)
+        observers = [counter, logger]
+
+    # Loggfila lukkes også når løseren feiler
+    try:
+        if arguments.profile is None:
+            run(arguments, observers)
         else:
-            vrp_ga()
+            import cProfile
+            import pstats
+
+            profiler = cProfile.Profile()
+            profiler.runcall(run, arguments, observers)
+            if arguments.profile:
+                profiler.dump_stats(arguments.profile)
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    finally:
+        if logger is not None:
+            logger.close()
+
+    if arguments.log is not None and counter.solver is not None:
+        counter.report()
@@ -0,0 +1,80 @@
+import random
+
+import numpy as np
+import pytest
+
+from travelling_salesman import genetic_algorithm as tsp_ga
+from travelling_salesman.environment import Fitness, initialize_random_environment
+from vehicle_routing import genetic_algorithm as vrp_ga
+from vehicle_routing.environment import Environment
+
+
+def draw_random_numbers():
+    return random.random(), random.gauss(0, 1), np.random.random(3).tolist()
+
+
+def test_tsp_population_round_trip(tmp_path):
+    environment = initialize_random_environment(num_cities=20, seed=0)
+    rng = np.random.default_rng(0)
+    population = np.array(
+        [rng.permutation(20) for _ in range(10)], dtype=environment.genome_dtype
+    )
+    history = [
+        (0, Fitness(population[0], environment)),
+        (9, Fitness(population[1], environment)),
+    ]
+
+    random.seed(1)
+    np.random.seed(1)
+    random.gauss(0, 1)
+    tsp_ga.save_population(tmp_path / "ga", population, history, 9, environment)
+    expected = draw_random_numbers()
+
+    random.seed(2)
+    np.random.seed(2)
+    loaded, loaded_history, generation = tsp_ga.load_population(
+        tmp_path / "ga", environment
+    )
+    assert draw_random_numbers() == expected
+
+    assert generation == 9
+    assert loaded.dtype == environment.genome_dtype
+    assert np.array_equal(loaded, population)
+    assert [g for g, _ in loaded_history] == [0, 9]
+    for (_, loaded_best), (_, best) in zip(loaded_history, history):
+        assert list(loaded_best.route) == best.route.tolist()
+        assert loaded_best.distance == pytest.approx(best.distance)
+
+
+def test_vrp_population_round_trip(tmp_path):
+    environment = Environment(num_cities=15, num_vehicles=4, seed=0)
+    random.seed(0)
+    population = np.array(
+        [vrp_ga.create_random_solution(environment) for _ in range(10)],
+        dtype=environment.genome_dtype,
+    )
+    history = [(0, 0.001, population[0].tolist()), (5, 0.002, population[1].tolist())]
+
+    np.random.seed(1)
+    vrp_ga.save_population(tmp_path / "ga", population, history, 5, environment)
+    expected = draw_random_numbers()
+
+    random.seed(2)
+    np.random.seed(2)
+    loaded, loaded_history, generation = vrp_ga.load_population(
+        tmp_path / "ga", environment
+    )
+    assert draw_random_numbers() == expected
+
+    assert generation == 5
+    assert np.array_equal(loaded, population)
+    assert loaded_history == history
+
+
+def test_checkpoint_rejects_other_environment(tmp_path):
+    environment = Environment(num_cities=15, num_vehicles=4, seed=0)
+    population = np.zeros((2, 18), dtype=environment.genome_dtype)
+    vrp_ga.save_population(tmp_path / "ga", population, [], 0, environment)
+
+    with pytest.raises(ValueError):
+        vrp_ga.load_population(tmp_path / "ga", Environment(15, 4, seed=1))
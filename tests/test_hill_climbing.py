@@ -0,0 +1,25 @@
+import random
+
+import pytest
+
+from travelling_salesman.environment import initialize_random_environment
+from travelling_salesman.hill_climbing import (
+    create_random_route,
+    evaluate,
+    next_generation,
+)
+
+
+@pytest.mark.parametrize("move_type", ["swap", "2opt", "insertion"])
+@pytest.mark.parametrize("selection", ["random", "first", "steepest"])
+def test_tracked_distance_matches_route_length(move_type, selection):
+    random.seed(0)
+    environment = initialize_random_environment(num_cities=30, seed=1)
+    solution = evaluate([create_random_route(environment)], environment)[0]
+
+    for _ in range(200):
+        solution = next_generation(solution, environment, move_type, selection)
+
+    assert solution.distance == pytest.approx(
+        environment.route_length(solution.route)
+    )
@@ -0,0 +1,155 @@
+import numpy as np
+import pytest
+
+from common.instances import parse_instance, tsplib_distances
+from travelling_salesman.environment import load_tsplib
+from vehicle_routing.environment import load_cvrplib
+
+BURMA14 = """NAME: burma14
+TYPE: TSP
+COMMENT: 14-Staedte in Burma (Zaw Win)
+DIMENSION: 14
+EDGE_WEIGHT_TYPE: GEO
+EDGE_WEIGHT_FORMAT: FUNCTION
+DISPLAY_DATA_TYPE: COORD_DISPLAY
+NODE_COORD_SECTION
+   1  16.47       96.10
+   2  16.47       94.44
+   3  20.09       92.54
+   4  22.39       93.37
+   5  25.23       97.24
+   6  22.00       96.05
+   7  20.47       97.02
+   8  17.20       96.29
+   9  16.30       97.38
+  10  14.05       98.12
+  11  16.53       97.38
+  12  21.52       95.59
+  13  19.41       97.13
+  14  20.09       94.55
+EOF
+"""
+
+ULYSSES16 = """NAME: ulysses16.tsp
+TYPE: TSP
+COMMENT: Odyssey of Ulysses (Groetschel/Padberg)
+DIMENSION: 16
+EDGE_WEIGHT_TYPE: GEO
+DISPLAY_DATA_TYPE: COORD_DISPLAY
+NODE_COORD_SECTION
+ 1 38.24 20.42
+ 2 39.57 26.15
+ 3 40.56 25.32
+ 4 36.26 23.12
+ 5 33.48 10.54
+ 6 37.56 12.19
+ 7 38.42 13.11
+ 8 37.52 20.44
+ 9 41.23 9.10
+ 10 41.17 13.05
+ 11 36.08 -5.21
+ 12 38.47 15.13
+ 13 38.15 15.35
+ 14 37.51 15.17
+ 15 35.49 14.32
+ 16 39.36 19.56
+ EOF
+"""
+
+# Nodene står i vilkårlig rekkefølge, og seksjonene har tomme linjer
+CVRP = """NAME : A-n5-k2
+COMMENT : (test)
+TYPE : CVRP
+DIMENSION : 5
+EDGE_WEIGHT_TYPE : EUC_2D
+CAPACITY : 10
+NODE_COORD_SECTION
+ 1 50 50
+ 3 90 10
+
+ 2 10 10
+ 4 10 90
+ 5 90 90
+DEMAND_SECTION
+1 0
+2 4
+3 5
+4 6
+
+5 3
+DEPOT_SECTION
+ 1
+ -1
+EOF
+"""
+
+
+def write(tmp_path, name, text):
+    path = tmp_path / name
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.mark.parametrize(
+    "name, text, tour, optimum",
+    [
+        ("burma14.tsp", BURMA14, [1, 2, 14, 3, 4, 5, 6, 12, 7, 13, 8, 11, 9, 10], 3323),
+        (
+            "ulysses16.tsp",
+            ULYSSES16,
+            [1, 14, 13, 12, 7, 6, 15, 5, 11, 9, 10, 16, 3, 2, 4, 8],
+            6859,
+        ),
+    ],
+)
+def test_optimal_tours_have_published_length(tmp_path, name, text, tour, optimum):
+    environment = load_tsplib(write(tmp_path, name, text))
+    assert environment.edge_weight_type == "GEO"
+    assert environment.route_length([city - 1 for city in tour]) == optimum
+
+
+def test_parse_cvrp_instance(tmp_path):
+    arrays, meta = parse_instance(write(tmp_path, "A-n5-k2.vrp", CVRP))
+    assert meta["dimension"] == 5
+    assert meta["capacity"] == 10
+    assert meta["vehicles"] == 2
+    assert meta["edge_weight_type"] == "EUC_2D"
+    assert arrays["coordinates"].tolist() == [
+        [50, 50],
+        [10, 10],
+        [90, 10],
+        [10, 90],
+        [90, 90],
+    ]
+    assert arrays["demands"].tolist() == [0, 4, 5, 6, 3]
+    assert arrays["depots"].tolist() == [0]
+
+    environment = load_cvrplib(write(tmp_path, "A-n5-k2.vrp", CVRP))
+    assert environment.num_vehicles == 2
+    assert [city.demand for city in environment.cities] == [4, 5, 6, 3]
+
+
+@pytest.mark.parametrize(
+    "edge_weight_type, a, b, expected",
+    [
+        ("EUC_2D", (0, 0), (3, 4), 5),
+        ("EUC_2D", (0, 0), (1, 1), 1),
+        ("EUC_2D", (0, 0), (1, 2), 2),
+        ("CEIL_2D", (0, 0), (3, 4), 5),
+        ("CEIL_2D", (0, 0), (1, 1), 2),
+        # ATT: r = sqrt(d² / 10), rundet opp når nint(r) < r
+        ("ATT", (0, 0), (3, 4), 2),
+        ("ATT", (0, 0), (10, 0), 4),
+        ("ATT", (0, 0), (30, 40), 16),
+    ],
+)
+def test_planar_distances(edge_weight_type, a, b, expected):
+    distance = tsplib_distances(
+        np.array(a, float), np.array(b, float), edge_weight_type
+    )
+    assert distance == expected
+
+
+def test_unsupported_edge_weight_type():
+    with pytest.raises(ValueError):
+        tsplib_distances(np.zeros(2), np.ones(2), "MAN_2D")
@@ -0,0 +1,41 @@
+import random
+import time
+
+import numpy as np
+import pytest
+
+from common.islands import run_islands
+
+
+def initialize():
+    return [random.uniform(0, 100) for _ in range(10)]
+
+
+def step(population):
+    # Ventetiden er bevisst ikke seedet, så øyene kommer i utakt med hverandre
+    time.sleep(np.random.default_rng().random() * 0.005)
+    return [value + random.gauss(0, 1) for value in population]
+
+
+def rank(population):
+    distances = np.asarray(population, dtype=float)
+    return distances, np.argsort(distances, kind="stable")
+
+
+@pytest.mark.parametrize("topology", ["ring", "random"])
+def test_same_seed_gives_same_result(topology):
+    def solve():
+        return run_islands(
+            initialize,
+            step,
+            rank,
+            generations=40,
+            islands=6,
+            migration_interval=1,
+            migration_size=3,
+            topology=topology,
+            seed=1,
+            timeout=30,
+        )
+
+    assert solve() == solve()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from travelling_salesman.construction import SEEDING_METHODS, construct_route
+from travelling_salesman.environment import Environment
+from travelling_salesman.local_search import improve_route, tour_length
+
+
+def random_environment(num_cities, edge_weight_type, seed):
+    rng = np.random.default_rng(seed)
+    if edge_weight_type == "GEO":
+        # Grader.minutter, som i TSPLIB
+        degrees = rng.integers(-60, 60, (num_cities, 2)) * [1, 2]
+        coordinates = (
+            degrees + np.sign(degrees) * rng.integers(0, 60, degrees.shape) / 100
+        )
+    else:
+        coordinates = rng.uniform(0, 1000, (num_cities, 2))
+    return Environment.from_coordinates(coordinates, edge_weight_type)
+
+
+@pytest.mark.parametrize("edge_weight_type", [None, "EUC_2D", "CEIL_2D", "ATT", "GEO"])
+@pytest.mark.parametrize("or_opt", [True, False])
+def test_improve_route_never_lengthens_tour(edge_weight_type, or_opt):
+    environment = random_environment(150, edge_weight_type, seed=0)
+    rng = np.random.default_rng(1)
+
+    for seeding in SEEDING_METHODS:
+        if seeding == "random":
+            route = rng.permutation(environment.num_cities).tolist()
+        else:
+            route = construct_route(environment, seeding)
+
+        # Lokalsøket kjøres flere ganger, siden et trekk som bare ser ut til
+        # å forbedre turen lettest avsløres når turen allerede er god
+        for _ in range(3):
+            improved = improve_route(
+                route, environment, num_neighbours=6, or_opt=or_opt
+            )
+            assert sorted(improved) == list(range(environment.num_cities))
+            assert tour_length(improved, environment) <= tour_length(route, environment)
+            route = improved
+
+        assert tour_length(route, environment) == pytest.approx(
+            environment.route_length(route)
+        )
+
+
+@pytest.mark.parametrize("num_cities", [1, 2, 3, 4, 5, 6])
+def test_improve_route_handles_small_instances(num_cities):
+    environment = random_environment(num_cities, None, seed=0)
+    route = list(range(num_cities))[::-1]
+    improved = improve_route(route, environment)
+
+    assert sorted(improved) == list(range(num_cities))
+    assert tour_length(improved, environment) <= tour_length(route, environment) + 1e-9
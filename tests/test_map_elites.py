@@ -0,0 +1,32 @@
+import numpy as np
+
+from vehicle_routing.environment import Environment
+from vehicle_routing.map_elites import Archive
+
+
+def test_insert_many_keeps_best_score_per_cell():
+    environment = Environment(num_cities=10, num_vehicles=3, seed=0)
+    archive = Archive(environment, 3, 3)
+    length = archive.genomes.shape[-1]
+
+    def insert(cells, scores):
+        # Genomet til hver kandidat er fylt med plassen den har i batchen
+        genomes = np.outer(np.arange(len(cells)), np.ones(length, dtype=int))
+        archive.insert_many(np.array(cells), np.array(scores), genomes)
+        return genomes
+
+    genomes = insert([4, 2, 4, 4, 2], [0.1, 0.9, 0.5, 0.3, 0.4])
+    assert archive.scores.reshape(-1)[[2, 4]].tolist() == [0.9, 0.5]
+    flat_genomes = archive.genomes.reshape(-1, length)
+    assert flat_genomes[2].tolist() == genomes[1].tolist()
+    assert flat_genomes[4].tolist() == genomes[2].tolist()
+    assert sorted(archive.occupied) == [2, 4]
+    assert archive.best_cell == (0, 2)
+
+    # En dårligere løsning erstatter ikke den som ligger i cellen
+    genomes = insert([2, 4, 4], [0.8, 0.2, 0.95])
+    assert archive.scores.reshape(-1)[[2, 4]].tolist() == [0.9, 0.95]
+    assert flat_genomes[2].tolist() == [1] * length
+    assert flat_genomes[4].tolist() == genomes[2].tolist()
+    assert sorted(archive.occupied) == [2, 4]
+    assert archive.best_cell == (1, 1)
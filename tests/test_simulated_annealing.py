@@ -0,0 +1,25 @@
+import warnings
+
+import numpy as np
+
+from travelling_salesman.environment import Fitness, initialize_random_environment
+from travelling_salesman.simulated_annealing import accept_moves, select
+
+
+def test_zero_temperature_accepts_only_improvements():
+    environment = initialize_random_environment(num_cities=10, seed=0)
+    solution = Fitness(list(range(10)), environment, np.float64(100.0))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        for delta in (np.float64(5.0), np.float64(0.0)):
+            assert select(solution, iter([("move", delta)]), 0.0) == (None, 0.0)
+        assert select(solution, iter([("move", -5.0)]), 0.0) == ("move", -5.0)
+
+        accepted = accept_moves(
+            np.full(3, 100.0),
+            np.array([5.0, 5.0, -5.0]),
+            np.array([0.0, 1e-320, 0.0]),
+            np.random.default_rng(0),
+        )
+    assert accepted.tolist() == [False, False, True]
@@ -0,0 +1,40 @@
+import random
+
+import numpy as np
+import pytest
+
+from vehicle_routing.environment import (
+    Environment,
+    evaluate_chromosome,
+    evaluate_population,
+)
+from vehicle_routing.genetic_algorithm import create_random_solution
+
+
+@pytest.mark.parametrize("unit_demands", [True, False])
+def test_evaluate_population_matches_evaluate_chromosome(unit_demands):
+    random.seed(0)
+    rng = np.random.default_rng(0)
+    coordinates = rng.uniform(0, 200, (31, 2))
+    demands = None if unit_demands else rng.integers(1, 10, 30)
+    environment = Environment.from_coordinates(
+        coordinates, num_vehicles=5, vehicle_capacity=20, demands=demands
+    )
+
+    population = [create_random_solution(environment) for _ in range(50)]
+    # Tomme biler: skillene først, sist og ved siden av hverandre
+    separators = [-i for i in range(1, 5)]
+    population.append(separators + list(range(30)))
+    population.append(list(range(30)) + separators)
+    population.append(list(range(15)) + separators + list(range(15, 30)))
+    population = np.asarray(population, dtype=environment.genome_dtype)
+
+    route_lengths, loads, penalties, totals = evaluate_population(
+        population, environment
+    )
+    for i, chromosome in enumerate(population):
+        expected = evaluate_chromosome(chromosome, environment)
+        assert route_lengths[i] == pytest.approx(expected[0])
+        assert loads[i].tolist() == expected[1]
+        assert penalties[i] == pytest.approx(expected[2])
+        assert totals[i] == pytest.approx(expected[3])
@@ -0,0 +1,234 @@
+from typing import List, Optional
+
+import numpy as np
+
+from common.instances import geo_points, tsplib_distances
+from .environment import Environment
+
+SEEDING_METHODS = ("random", "nearest_neighbour", "greedy", "space_filling_curve")
+
+
+def _search_points(environment: Environment) -> np.ndarray:
+    # Punktene nærmeste-nabo-søkene gjøres i. GEO-instansene lagrer grader og
+    # minutter, som ikke kan sammenlignes euklidsk.
+    if environment.edge_weight_type == "GEO":
+        return geo_points(environment.coordinates)
+    return environment.coordinates
+
+
+class NearestRemaining:
+    # KD-tre over punkter som fjernes etter hvert. Treet bygges på nytt når
+    # over halvparten av punktene er fjernet, så hvert oppslag koster
+    # O(log n) amortisert i stedet for å lete gjennom alle punktene.
+    def __init__(self, coordinates: np.ndarray) -> None:
+        self.coordinates = coordinates
+        self.remaining = np.ones(len(coordinates), dtype=bool)
+        self.count = len(coordinates)
+        self._build()
+
+    def _build(self) -> None:
+        from scipy.spatial import cKDTree
+
+        self.indices = np.flatnonzero(self.remaining)
+        self.tree = cKDTree(self.coordinates[self.indices])
+
+    def remove(self, i: int) -> None:
+        if self.remaining[i]:
+            self.remaining[i] = False
+            self.count -= 1
+
+    def query(self, point: np.ndarray, n: int = 1) -> np.ndarray:
+        if self.count == 0:
+            return np.empty(0, dtype=np.intp)
+        if 2 * self.count < len(self.indices):
+            self._build()
+
+        k = min(max(2 * n, 8), len(self.indices))
+        while True:
+            _, found = self.tree.query(point, k)
+            found = self.indices[np.atleast_1d(found)]
+            found = found[self.remaining[found]]
+            if len(found) >= n or k == len(self.indices):
+                return found[:n]
+            k = min(2 * k, len(self.indices))
+
+
+def nearest_neighbour_route(
+    environment: Environment,
+    rng: Optional[np.random.Generator] = None,
+    choices: int = 3,
+    randomness: float = 0.1,
+) -> List[int]:
+    # Med rng startes det i en tilfeldig by, og av og til velges en av de
+    # nærmeste byene i stedet for den aller nærmeste
+    coordinates = _search_points(environment)
+    n = len(coordinates)
+    current = 0 if rng is None else int(rng.integers(n))
+
+    index = NearestRemaining(coordinates)
+    index.remove(current)
+    route = [current]
+    for _ in range(n - 1):
+        if rng is not None and rng.random() < randomness:
+            candidates = index.query(coordinates[current], choices)
+            current = int(candidates[rng.integers(len(candidates))])
+        else:
+            current = int(index.query(coordinates[current])[0])
+        index.remove(current)
+        route.append(current)
+
+    return route
+
+
+def _join_fragments(fragments: List[List[int]], coordinates: np.ndarray) -> List[int]:
+    # Knytter sammen delrutene ved å gå fra enden av én til nærmeste ende av
+    # en annen
+    ends, owners = [], []
+    for i, fragment in enumerate(fragments):
+        for end in {fragment[0], fragment[-1]}:
+            ends.append(end)
+            owners.append(i)
+    ends, owners = np.asarray(ends), np.asarray(owners)
+    first_end = np.searchsorted(owners, np.arange(len(fragments)))
+
+    index = NearestRemaining(coordinates[ends])
+
+    def take(i: int) -> None:
+        index.remove(first_end[i])
+        if len(fragments[i]) > 1:
+            index.remove(first_end[i] + 1)
+
+    route = list(fragments[0])
+    take(0)
+    for _ in range(len(fragments) - 1):
+        end = int(index.query(coordinates[route[-1]])[0])
+        fragment = fragments[owners[end]]
+        route.extend(fragment if ends[end] == fragment[0] else fragment[::-1])
+        take(owners[end])
+
+    return route
+
+
+def greedy_route(
+    environment: Environment,
+    rng: Optional[np.random.Generator] = None,
+    num_neighbours: int = 10,
+    noise: float = 0.1,
+) -> List[int]:
+    # Greedy edge: kortere kanter legges til så lenge ingen by får mer enn to
+    # kanter og ingen sykel lukkes. Bare kanter til de nærmeste naboene vurderes.
+    coordinates = environment.coordinates
+    n = len(coordinates)
+    if n < 3:
+        return list(range(n))
+
+    neighbours = environment.nearest_neighbours(num_neighbours)
+    first = np.repeat(np.arange(n), neighbours.shape[1])
+    edges = np.unique(np.sort(np.stack((first, neighbours.ravel()), 1)), axis=0)
+    if environment.edge_weight_type is None:
+        lengths = np.hypot(*(coordinates[edges[:, 0]] - coordinates[edges[:, 1]]).T)
+    else:
+        lengths = tsplib_distances(
+            coordinates[edges[:, 0]],
+            coordinates[edges[:, 1]],
+            environment.edge_weight_type,
+        )
+    if rng is not None:
+        # Støy på kantlengdene gir ulike, men fortsatt gode, turer
+        lengths = lengths * (1 + noise * rng.random(len(lengths)))
+
+    degree = [0] * n
+    parent = list(range(n))
+    adjacent = [[] for _ in range(n)]
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for a, b in edges[np.argsort(lengths, kind="stable")].tolist():
+        if degree[a] < 2 and degree[b] < 2:
+            root_a, root_b = root(a), root(b)
+            if root_a != root_b:
+                parent[root_a] = root_b
+                degree[a] += 1
+                degree[b] += 1
+                adjacent[a].append(b)
+                adjacent[b].append(a)
+
+    # Går langs hver delrute fra den ene enden til den andre
+    fragments = []
+    visited = [False] * n
+    for start in range(n):
+        if visited[start] or degree[start] == 2:
+            continue
+        fragment, previous, current = [start], -1, start
+        visited[start] = True
+        while True:
+            following = [c for c in adjacent[current] if c != previous]
+            if not following:
+                break
+            previous, current = current, following[0]
+            visited[current] = True
+            fragment.append(current)
+        fragments.append(fragment)
+
+    if rng is not None:
+        fragments.insert(0, fragments.pop(int(rng.integers(len(fragments)))))
+    return _join_fragments(fragments, _search_points(environment))
+
+
+def hilbert_indices(points: np.ndarray, order: int = 16) -> np.ndarray:
+    # Posisjonen til hvert punkt langs en Hilbert-kurve over et 2^order-rutenett
+    size = 2**order
+    low = points.min(axis=0)
+    span = (points.max(axis=0) - low).max() or 1.0
+    x, y = ((points - low) / span * (size - 1)).astype(np.int64).T
+
+    indices = np.zeros(len(points), dtype=np.int64)
+    s = size // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        indices += s * s * ((3 * rx) ^ ry)
+
+        flip = ~ry & rx
+        x = np.where(flip, size - 1 - x, x)
+        y = np.where(flip, size - 1 - y, y)
+        x, y = np.where(ry, x, y), np.where(ry, y, x)
+        s //= 2
+
+    return indices
+
+
+def space_filling_curve_route(
+    environment: Environment, rng: Optional[np.random.Generator] = None
+) -> List[int]:
+    # Byene besøkes i rekkefølgen de har langs en Hilbert-kurve. Med rng
+    # roteres og forskyves planet først, så kurven treffer byene i en annen
+    # rekkefølge.
+    points = environment.coordinates
+    if rng is not None:
+        angle = rng.uniform(0, 2 * np.pi)
+        rotation = np.array(
+            [[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]]
+        )
+        span = np.ptp(points, axis=0).max()
+        points = points @ rotation + rng.uniform(0, span, 2)
+
+    return np.argsort(hilbert_indices(points), kind="stable").tolist()
+
+
+def construct_route(
+    environment: Environment,
+    method: str,
+    rng: Optional[np.random.Generator] = None,
+) -> List[int]:
+    if method == "nearest_neighbour":
+        return nearest_neighbour_route(environment, rng)
+    if method == "greedy":
+        return greedy_route(environment, rng)
+    if method == "space_filling_curve":
+        return space_filling_curve_route(environment, rng)
+    raise ValueError(f"Unknown seeding: {method}")
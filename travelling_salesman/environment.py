@@ -1,8 +1,22 @@
+from typing import List, Optional, Sequence
+
 import numpy as np
 import random
 
+from common.checkpoint import load_checkpoint
+from common.genome import smallest_int_dtype
+from common.instances import (
+    NUM_NEIGHBOURS,
+    load_instance,
+    nearest_neighbour_lists,
+    tsplib_distance_matrix,
+)
+
 
 class City:
+    # Uten __dict__ tar hver by bare plass til de to koordinatene
+    __slots__ = ("x", "y")
+
     def __init__(self, x: float, y: float) -> None:
         self.x = x
         self.y = y
@@ -14,36 +28,129 @@ class City:
         return f"({self.x},{self.y})"
 
 
+def calculate_distance_matrix(coordinates: np.ndarray) -> np.ndarray:
+    dx = coordinates[:, np.newaxis, 0] - coordinates[np.newaxis, :, 0]
+    dy = coordinates[:, np.newaxis, 1] - coordinates[np.newaxis, :, 1]
+    return np.hypot(dx, dy)
+
+
+class Environment:
+    def __init__(
+        self, cities: List[City], edge_weight_type: Optional[str] = None
+    ) -> None:
+        self.cities = cities
+        self.coordinates = np.array([(c.x, c.y) for c in cities], dtype=float)
+        # None gir ikke-avrundede euklidske avstander, ellers brukes
+        # avstandsfunksjonen fra TSPLIB (EUC_2D, CEIL_2D, ATT eller GEO)
+        self.edge_weight_type = edge_weight_type
+        self._distance_matrix = None
+        self._nearest_neighbours = None
+
+    @classmethod
+    def from_coordinates(
+        cls, coordinates: np.ndarray, edge_weight_type: Optional[str] = None
+    ):
+        cities = [City(x=x, y=y) for x, y in np.asarray(coordinates).tolist()]
+        return cls(cities, edge_weight_type)
+
+    @property
+    def num_cities(self) -> int:
+        return len(self.cities)
+
+    @property
+    def genome_dtype(self) -> np.dtype:
+        return smallest_int_dtype(0, self.num_cities - 1)
+
+    @property
+    def distance_matrix(self) -> np.ndarray:
+        # Beregnes først ved behov, siden matrisen blir stor for mange byer
+        if self._distance_matrix is None:
+            if self.edge_weight_type is None:
+                self._distance_matrix = calculate_distance_matrix(self.coordinates)
+            else:
+                self._distance_matrix = tsplib_distance_matrix(
+                    self.coordinates, self.edge_weight_type
+                )
+        return self._distance_matrix
+
+    def nearest_neighbours(self, k: int) -> np.ndarray:
+        k = min(k, self.num_cities - 1)
+        if self._nearest_neighbours is None or self._nearest_neighbours.shape[1] < k:
+            self._nearest_neighbours = nearest_neighbour_lists(self.coordinates, k)
+        return self._nearest_neighbours[:, :k]
+
+    def route_length(self, route: Sequence[int]) -> float:
+        route = np.asarray(route)
+        return float(self.distance_matrix[route, np.roll(route, -1)].sum())
+
+    def route_lengths(self, routes: np.ndarray) -> np.ndarray:
+        return self.distance_matrix[routes, np.roll(routes, -1, axis=1)].sum(axis=1)
+
+    def decode_route(self, route: Sequence[int]) -> List[City]:
+        return [self.cities[i] for i in route]
+
+
+def population_distances(routes: np.ndarray, environment: Environment) -> np.ndarray:
+    return environment.route_lengths(routes)
+
+
 class Fitness:
-    def __init__(self, route) -> None:
+    def __init__(
+        self,
+        route: Sequence[int],
+        environment: Environment,
+        distance: Optional[float] = None,
+    ) -> None:
         self.route = route
-        self._distance = 0
-        self._fitness = 0
+        self.environment = environment
+        self._distance = distance
+        self._fitness = None
 
     @property
     def distance(self) -> float:
-        if self._distance == 0:
-            path_distance = 0
-            for i in range(len(self.route)):
-                from_city = self.route[i]
-                to_city = self.route[(i + 1) % len(self.route)]
-                path_distance += from_city.distance(to_city)
-            self._distance = path_distance
+        if self._distance is None:
+            self._distance = self.environment.route_length(self.route)
         return self._distance
 
     @property
     def fitness(self) -> float:
-        if self._fitness == 0:
+        if self._fitness is None:
             self._fitness = 1 / float(self.distance)
         return self._fitness
 
 
-def initialize_random_environment(num_cities=25, seed=None):
+def initialize_random_environment(num_cities=25, seed=None) -> Environment:
     city_list = []
 
-    random.seed(seed)
+    # Egen generator, slik at samme seed gir samme instans uten å endre den
+    # globale tilstanden til random
+    rng = random.Random(seed)
 
     for _ in range(num_cities):
-        city_list.append(City(x=random.randint(0, 200), y=random.randint(0, 200)))
+        city_list.append(City(x=rng.randint(0, 200), y=rng.randint(0, 200)))
+
+    return Environment(city_list)
+
+
+def load_environment(path: str) -> Optional[Environment]:
+    # Miljøet lagres i sjekkpunktet, slik at en tilfeldig instans kan gjenskapes
+    checkpoint = load_checkpoint(path, restore_random=False)
+    if checkpoint is None:
+        return None
+
+    arrays, meta = checkpoint
+    return Environment.from_coordinates(
+        arrays["coordinates"], meta.get("edge_weight_type")
+    )
+
 
-    return city_list
+def load_tsplib(path: str, num_neighbours: int = NUM_NEIGHBOURS) -> Environment:
+    # Leser en TSPLIB-instans (.tsp). Nabolistene fra cachen brukes direkte av
+    # lokalsøket
+    arrays, meta = load_instance(path, num_neighbours)
+    environment = Environment.from_coordinates(
+        arrays["coordinates"], meta["edge_weight_type"]
+    )
+    if "neighbours" in arrays:
+        environment._nearest_neighbours = np.asarray(arrays["neighbours"])
+    return environment
@@ -1,26 +1,110 @@
+from functools import partial
+import os
 import random
-from typing import List
-
-from .environment import Fitness, City, initialize_random_environment
-from .plotting import plot_route, plot_history
-
-
-def create_random_route(cities: List[City]) -> List[City]:
-    route = random.sample(cities, len(cities))
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from common.animation import FrameWriter
+from common.cache import EvaluationCache
+from common.checkpoint import check_coordinates, load_checkpoint, save_checkpoint
+from common.islands import run_islands
+from common.observers import Observer, combine, population_metrics, timed
+from common.parallel import ParallelEvaluator
+from .environment import (
+    Environment,
+    Fitness,
+    initialize_random_environment,
+    load_environment,
+    population_distances,
+)
+from .construction import construct_route
+from .local_search import improve_route
+from .plotting import draw_route_frame, plot_route, plot_history
+
+
+def create_random_route(environment: Environment) -> List[int]:
+    route = random.sample(range(environment.num_cities), environment.num_cities)
     return route
 
 
-def initialize_population(population_size: int, cities: List[City]) -> List[List[City]]:
+def initialize_population(
+    population_size: int, environment: Environment, seeding: str = "random"
+) -> np.ndarray:
     population = []
 
-    # TODO Initialiser populasjonen med population_size løsninger
-
-    return population
+    # Konstruksjonsheuristikkene gir gode startløsninger. Den første er
+    # deterministisk, resten er randomiserte varianter så populasjonen får
+    # variasjon.
+    if seeding != "random":
+        rng = np.random.default_rng(random.getrandbits(64))
+        population = [
+            construct_route(environment, seeding, rng if i > 0 else None)
+            for i in range(population_size)
+        ]
+        return np.asarray(population, dtype=environment.genome_dtype)
 
+    # TODO Initialiser populasjonen med population_size løsninger
 
-def evaluate(population) -> List[Fitness]:
-    fitness_results = [Fitness(x) for x in population]
-    return sorted(fitness_results, key=lambda x: x.fitness, reverse=True)
+    # Populasjonen holdes som én matrise med én rad per individ
+    return np.asarray(population, dtype=environment.genome_dtype)
+
+
+def rank_population(
+    population: np.ndarray,
+    environment: Environment,
+    cache: Optional[EvaluationCache] = None,
+    evaluator: Optional[ParallelEvaluator] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    def compute_distances(routes: np.ndarray) -> np.ndarray:
+        if evaluator is not None:
+            return evaluator.evaluate(routes)
+        return population_distances(routes, environment)
+
+    if cache is None:
+        distances = compute_distances(
+            np.asarray(population, dtype=environment.genome_dtype)
+        )
+    else:
+        distances = np.empty(len(population))
+        keys = [cache.key_function(individual) for individual in population]
+        missing = []
+        for i, key in enumerate(keys):
+            distance = cache.get_key(key)
+            if distance is None:
+                missing.append(i)
+            else:
+                distances[i] = distance
+
+        # Bare løsninger som ikke finnes i cachen blir evaluert
+        if missing:
+            routes = np.asarray(population, dtype=environment.genome_dtype)[missing]
+            distances[missing] = compute_distances(routes)
+            for i in missing:
+                cache.put_key(keys[i], distances[i])
+
+    return distances, np.argsort(distances, kind="stable")
+
+
+def evaluate(
+    population: np.ndarray,
+    environment: Environment,
+    cache: Optional[EvaluationCache] = None,
+    evaluator: Optional[ParallelEvaluator] = None,
+) -> List[Fitness]:
+    distances, order = rank_population(population, environment, cache, evaluator)
+    return [Fitness(population[i], environment, distances[i]) for i in order]
+
+
+def best_solution(
+    population: np.ndarray,
+    environment: Environment,
+    cache: Optional[EvaluationCache] = None,
+    evaluator: Optional[ParallelEvaluator] = None,
+) -> Fitness:
+    # Ruta kopieres ut, ellers holder historikken på hele populasjonen
+    best = evaluate(population, environment, cache, evaluator)[0]
+    return Fitness(np.array(best.route), environment, best.distance)
 
 
 def selection(population_ranked: List[Fitness], elite_size: float):
@@ -36,7 +120,7 @@ def selection(population_ranked: List[Fitness], elite_size: float):
     return [x.route for x in selection_results]
 
 
-def crossover(parent1, parent2) -> List[City]:
+def crossover(parent1, parent2) -> List[int]:
     # TODO Implementer crossover
 
     child = parent1
@@ -44,23 +128,26 @@ def crossover(parent1, parent2) -> List[City]:
     return child
 
 
-def recombine(mating_pool: List[List[City]], elite_size: int) -> List[List[City]]:
-    children = []
+def recombine(mating_pool: np.ndarray, elite_size: int) -> np.ndarray:
+    children = np.empty_like(mating_pool)
     length = len(mating_pool) - elite_size
 
     # Lar igjen de beste løsningene bli med direkte
-    for i in range(elite_size):
-        children.append(mating_pool[i])
+    children[:elite_size] = mating_pool[:elite_size]
 
-    pool = random.sample(mating_pool, len(mating_pool))
+    # Foreldrene gis til crossover som lister, og barnet skrives rett inn i
+    # matrisen
+    pool = random.sample(range(len(mating_pool)), len(mating_pool))
     for i in range(length):
-        child = crossover(pool[i], pool[-i - 1])
-        children.append(child)
+        child = crossover(
+            mating_pool[pool[i]].tolist(), mating_pool[pool[-i - 1]].tolist()
+        )
+        children[elite_size + i] = child
 
     return children
 
 
-def mutate(individual: List[City], mutation_rate: float) -> List[City]:
+def mutate(individual: List[int], mutation_rate: float) -> List[int]:
     individual = [x for x in individual]
 
     # TODO Implementer mutation-mekanisme
@@ -68,76 +155,317 @@ def mutate(individual: List[City], mutation_rate: float) -> List[City]:
     return individual
 
 
-def mutate_population(
-    population: List[List[City]], mutation_rate: float
-) -> List[List[City]]:
-    mutated_pop = [mutate(x, mutation_rate) for x in population]
+def mutate_population(population: np.ndarray, mutation_rate: float) -> np.ndarray:
+    mutated_pop = np.empty_like(population)
+    for i, individual in enumerate(population):
+        mutated_pop[i] = mutate(individual.tolist(), mutation_rate)
 
     return mutated_pop
 
 
+def improve_population(
+    population: np.ndarray, environment: Environment, elite_size: int
+) -> np.ndarray:
+    improved = population.copy()
+    for i, route in enumerate(population[:elite_size]):
+        improved[i] = improve_route(route, environment)
+
+    return improved
+
+
 def next_generation(
-    current_gen: List[List[City]], elite_size: int, mutation_rate: float
-) -> List[List[City]]:
-    pop_ranked = evaluate(current_gen)
-    mating_pool = selection(pop_ranked, elite_size)
-    children = recombine(mating_pool, elite_size)
-    next_gen = mutate_population(children, mutation_rate)
+    current_gen: np.ndarray,
+    environment: Environment,
+    elite_size: int,
+    mutation_rate: float,
+    local_search: bool = False,
+    cache: Optional[EvaluationCache] = None,
+    evaluator: Optional[ParallelEvaluator] = None,
+    observer: Optional[Observer] = None,
+    generation: int = 0,
+) -> np.ndarray:
+    misses = cache.misses if cache is not None else 0
+    pop_ranked = timed(
+        observer, "evaluate", evaluate, current_gen, environment, cache, evaluator
+    )
+    mating_pool = timed(observer, "selection", selection, pop_ranked, elite_size)
+    mating_pool = np.asarray(mating_pool, dtype=environment.genome_dtype)
+    children = timed(observer, "recombine", recombine, mating_pool, elite_size)
+    next_gen = timed(observer, "mutate", mutate_population, children, mutation_rate)
+
+    # Forbedrer de beste løsningene med 2-opt/Or-opt
+    if local_search:
+        next_gen = timed(
+            observer,
+            "local_search",
+            improve_population,
+            next_gen,
+            environment,
+            elite_size,
+        )
+
+    if observer is not None:
+        evaluations = cache.misses - misses if cache is not None else len(current_gen)
+        observer.on_generation(
+            generation,
+            population_metrics(
+                [x.distance for x in pop_ranked], current_gen, evaluations, cache
+            ),
+        )
 
     return next_gen
 
 
+def save_population(
+    path: str,
+    population: np.ndarray,
+    history: List[Tuple[int, Fitness]],
+    generation: int,
+    environment: Environment,
+) -> None:
+    save_checkpoint(
+        path,
+        {
+            "coordinates": environment.coordinates,
+            "population": np.asarray(population, dtype=environment.genome_dtype),
+            "history_routes": np.asarray(
+                [x[1].route for x in history], dtype=environment.genome_dtype
+            ),
+        },
+        {
+            "generation": generation,
+            "edge_weight_type": environment.edge_weight_type,
+            "history_generations": [x[0] for x in history],
+            "history_distances": [float(x[1].distance) for x in history],
+        },
+    )
+
+
+def load_population(
+    path: str, environment: Environment
+) -> Optional[Tuple[np.ndarray, List[Tuple[int, Fitness]], int]]:
+    checkpoint = load_checkpoint(path)
+    if checkpoint is None:
+        return None
+
+    arrays, meta = checkpoint
+    check_coordinates(arrays, environment.coordinates)
+    history = [
+        (g, Fitness(route, environment, distance))
+        for g, route, distance in zip(
+            meta["history_generations"],
+            arrays["history_routes"].tolist(),
+            meta["history_distances"],
+        )
+    ]
+    population = np.array(arrays["population"], dtype=environment.genome_dtype)
+    return population, history, meta["generation"]
+
+
 def solve(
-    cities: List[City],
+    environment: Environment,
     population_size: int,
     elite_size: int,
     mutation_rate: float,
     generations: int,
     eval_frequency: int = 50,
     show_plots: bool = True,
-) -> List[City]:
-    initial_pop = initialize_population(population_size, cities)
-    best_initial_solution = evaluate(initial_pop)[0]
-    print(f"Initial distance: {best_initial_solution.distance}")
-    if show_plots:
-        plot_route(best_initial_solution.route, "Initial")
-
-    pop = initial_pop
-
-    history = [(0, best_initial_solution)]
-
-    for g in range(generations):
-        pop = next_generation(pop, elite_size, mutation_rate)
-
-        if (g + 1) % eval_frequency == 0:
-            best_current_solution = evaluate(pop)[0]
-            history.append((g, best_current_solution))
-            print(
-                f"[{g+1}/{generations}] Best distance: {best_current_solution.distance}"
+    local_search: bool = False,
+    cache: Optional[EvaluationCache] = None,
+    workers: int = 1,
+    checkpoint_path: Optional[str] = None,
+    checkpoint_frequency: int = 100,
+    resume: bool = False,
+    headless: bool = False,
+    animation_path: Optional[str] = None,
+    observers: Optional[List[Observer]] = None,
+    seeding: str = "random",
+) -> List[int]:
+    show_plots = show_plots and not headless
+    observer = combine(observers)
+    if observer is not None:
+        observer.on_start(
+            "tsp_ga",
+            dict(
+                num_cities=environment.num_cities,
+                population_size=population_size,
+                elite_size=elite_size,
+                mutation_rate=mutation_rate,
+                generations=generations,
+            ),
+        )
+    # Evaluering fordeles på flere prosesser dersom workers > 1
+    evaluator = None
+    if workers > 1:
+        evaluator = ParallelEvaluator(population_distances, environment, workers)
+    writer = FrameWriter(animation_path) if animation_path is not None else None
+
+    try:
+        checkpoint = None
+        if resume and checkpoint_path is not None:
+            checkpoint = load_population(checkpoint_path, environment)
+
+        if checkpoint is None:
+            initial_pop = initialize_population(population_size, environment, seeding)
+            best_initial_solution = best_solution(
+                initial_pop, environment, cache, evaluator
             )
-
+            print(f"Initial distance: {best_initial_solution.distance}")
             if show_plots:
-                plot_route(best_current_solution.route, f"Generation {g + 1}")
+                plot_route(best_initial_solution.route, environment, "Initial")
+
+            pop = initial_pop
+            history = [(0, best_initial_solution)]
+            start = 0
+        else:
+            pop, history, start = checkpoint
+            print(f"Resuming from generation {start}")
+
+        for g in range(start, generations):
+            pop = next_generation(
+                pop,
+                environment,
+                elite_size,
+                mutation_rate,
+                local_search,
+                cache,
+                evaluator,
+                observer,
+                g + 1,
+            )
 
-    best_final_solution = evaluate(pop)[0]
-    print(f"Final distance: {best_final_solution.distance}")
-    plot_history(history)
-    plot_route(best_final_solution.route, "Final solution")
+            if (g + 1) % eval_frequency == 0:
+                best_current_solution = best_solution(
+                    pop, environment, cache, evaluator
+                )
+                history.append((g, best_current_solution))
+                print(
+                    f"[{g+1}/{generations}] Best distance: {best_current_solution.distance}"
+                )
+
+                if show_plots:
+                    plot_route(
+                        best_current_solution.route, environment, f"Generation {g + 1}"
+                    )
+                if writer is not None:
+                    writer.append(
+                        partial(
+                            draw_route_frame,
+                            route=best_current_solution.route,
+                            environment=environment,
+                            title=f"Generation {g + 1}",
+                        )
+                    )
+
+            # Lagres etter historikken, så sjekkpunktet tar med denne generasjonen
+            if checkpoint_path is not None and (g + 1) % checkpoint_frequency == 0:
+                save_population(checkpoint_path, pop, history, g + 1, environment)
+
+        best_final_solution = best_solution(pop, environment, cache, evaluator)
+        print(f"Final distance: {best_final_solution.distance}")
+        if observer is not None:
+            observer.on_end({"best_distance": float(best_final_solution.distance)})
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+        if writer is not None:
+            writer.close()
+
+    if not headless:
+        plot_history(history, environment)
+        plot_route(best_final_solution.route, environment, "Final solution")
+
+    return best_final_solution.route.tolist()
+
+
+def solve_islands(
+    environment: Environment,
+    population_size: int,
+    elite_size: int,
+    mutation_rate: float,
+    generations: int,
+    islands: Optional[int] = None,
+    migration_interval: int = 10,
+    migration_size: int = 2,
+    topology: str = "ring",
+    show_plots: bool = True,
+    headless: bool = False,
+    local_search: bool = False,
+    seed: Optional[int] = None,
+    seeding: str = "random",
+) -> List[int]:
+    show_plots = show_plots and not headless
+    # Én øy per kjerne dersom ikke annet er oppgitt
+    islands = islands or os.cpu_count()
+
+    distance, route = run_islands(
+        initialize=partial(
+            initialize_population, population_size, environment, seeding
+        ),
+        step=partial(
+            next_generation,
+            environment=environment,
+            elite_size=elite_size,
+            mutation_rate=mutation_rate,
+            local_search=local_search,
+        ),
+        rank=partial(rank_population, environment=environment),
+        generations=generations,
+        islands=islands,
+        migration_interval=migration_interval,
+        migration_size=migration_size,
+        topology=topology,
+        seed=seed,
+    )
+    print(f"Final distance: {distance}")
 
-    return best_final_solution.route
+    if show_plots:
+        plot_route(route, environment, "Final solution")
 
+    return route.tolist()
 
-def main():
-    city_list = initialize_random_environment()
+
+def main(
+    checkpoint_path: Optional[str] = None,
+    resume: bool = False,
+    headless: bool = False,
+    observers: Optional[List[Observer]] = None,
+):
+    environment = None
+    if resume and checkpoint_path is not None:
+        environment = load_environment(checkpoint_path)
+    if environment is None:
+        environment = initialize_random_environment()
 
     best_route = solve(
-        cities=city_list,
+        environment=environment,
         population_size=100,
         elite_size=5,
         mutation_rate=0.05,
         generations=150,
         eval_frequency=10,
         show_plots=False,
+        checkpoint_path=checkpoint_path,
+        checkpoint_frequency=10,
+        resume=resume,
+        headless=headless,
+        observers=observers,
+    )
+
+
+def main_islands(headless: bool = False):
+    environment = initialize_random_environment()
+
+    best_route = solve_islands(
+        environment=environment,
+        population_size=100,
+        elite_size=5,
+        mutation_rate=0.05,
+        generations=150,
+        migration_interval=10,
+        migration_size=2,
+        show_plots=False,
+        headless=headless,
     )
 
 
@@ -1,86 +1,164 @@
 from travelling_salesman.plotting import plot_history, plot_route
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+import itertools
 import random
-from .environment import City, Fitness, initialize_random_environment
+from common.observers import Observer, combine, timed
+from .construction import construct_route
+from .environment import Environment, Fitness, initialize_random_environment
+from .moves import Move, apply_move, iterate_moves, move_delta, random_move
 
 
-def create_random_route(cities: List[City]) -> List[City]:
-    route = random.sample(cities, len(cities))
+def create_random_route(environment: Environment) -> List[int]:
+    route = random.sample(range(environment.num_cities), environment.num_cities)
     return route
 
 
-def get_neighbours(solution: List[City]) -> List[List[City]]:
-    neighbours = []
-
-    for i in range(len(solution) - 1):
-        neighbour = [x for x in solution]
-        neighbour[i], neighbour[i + 1] = neighbour[i + 1], neighbour[i]
-        neighbours.append(neighbour)
-
-    return neighbours
-
-
-def evaluate(solutions: List[List[City]]) -> List[Fitness]:
-    return [Fitness(x) for x in solutions]
-
-
-def select(current_solution: Fitness, solutions: List[Fitness]) -> Fitness:
-    next_solution = random.sample(solutions, 1)[0]
-    if next_solution.fitness > current_solution.fitness:
-        return next_solution
-    return current_solution
-
-
-def next_generation(cur_solution: List[City]) -> List[City]:
-    neighbours = get_neighbours(cur_solution)
-    fitness = evaluate(neighbours)
-    next_gen = select(Fitness(cur_solution), fitness)
-
-    return next_gen.route
+def get_neighbours(
+    solution: List[int],
+    environment: Environment,
+    move_type: str = "swap",
+    selection: str = "random",
+) -> Iterator[Tuple[Move, float]]:
+    n = len(solution)
+    if selection == "random":
+        moves = (random_move(n, move_type) for _ in itertools.count())
+    else:
+        moves = iterate_moves(n, move_type, start=random.randrange(n))
+
+    # Naboer lages og evalueres først når de trengs
+    for move in moves:
+        yield move, move_delta(solution, move, environment, move_type)
+
+
+def evaluate(solutions: List[List[int]], environment: Environment) -> List[Fitness]:
+    return [Fitness(x, environment) for x in solutions]
+
+
+def select(
+    current_solution: Fitness,
+    neighbours: Iterator[Tuple[Move, float]],
+    selection: str = "random",
+) -> Tuple[Optional[Move], float]:
+    if selection == "steepest":
+        move, delta = min(neighbours, key=lambda x: x[1], default=(None, 0.0))
+    elif selection == "first":
+        move, delta = next(((m, d) for m, d in neighbours if d < 0), (None, 0.0))
+    elif selection == "random":
+        move, delta = next(neighbours)
+    else:
+        raise ValueError(f"Unknown selection: {selection}")
+
+    if move is not None and delta < 0:
+        return move, delta
+    return None, 0.0
+
+
+def next_generation(
+    cur_solution: Fitness,
+    environment: Environment,
+    move_type: str = "swap",
+    selection: str = "random",
+    observer: Optional[Observer] = None,
+    generation: int = 0,
+) -> Fitness:
+    neighbours = get_neighbours(cur_solution.route, environment, move_type, selection)
+    # Trekkene er så raske at tidtakingen bare gjøres når noen observerer
+    if observer is None:
+        move, delta = select(cur_solution, neighbours, selection)
+    else:
+        # Teller hvor mange naboer select faktisk evaluerte
+        evaluations = itertools.count()
+        neighbours = (x for x, _ in zip(neighbours, evaluations))
+        move, delta = timed(
+            observer, "select", select, cur_solution, neighbours, selection
+        )
+    # Lengden må leses før ruta endres på stedet, ellers telles trekket to ganger
+    distance = cur_solution.distance
+    if move is not None:
+        apply_move(cur_solution.route, move, move_type)
+        cur_solution = Fitness(cur_solution.route, environment, distance + delta)
+
+    if observer is not None:
+        observer.on_generation(
+            generation,
+            {"best_distance": cur_solution.distance, "evaluations": next(evaluations)},
+        )
+
+    return cur_solution
 
 
 def solve(
-    cities: List[City],
+    environment: Environment,
     generations: int = 500,
     eval_frequency: int = 50,
     show_plots: bool = True,
-) -> Fitness:
-    initial_solution = create_random_route(cities)
-    best_initial_solution = evaluate([initial_solution])[0]
+    move_type: str = "swap",
+    selection: str = "random",
+    headless: bool = False,
+    observers: Optional[List[Observer]] = None,
+    seeding: str = "random",
+) -> List[int]:
+    show_plots = show_plots and not headless
+    observer = combine(observers)
+    if observer is not None:
+        observer.on_start(
+            "tsp_hc",
+            dict(
+                num_cities=environment.num_cities,
+                generations=generations,
+                move_type=move_type,
+                selection=selection,
+            ),
+        )
+
+    if seeding == "random":
+        initial_solution = create_random_route(environment)
+    else:
+        initial_solution = construct_route(environment, seeding)
+    best_initial_solution = evaluate([initial_solution], environment)[0]
     print(f"Initial distance: {best_initial_solution.distance}")
     if show_plots:
-        plot_route(best_initial_solution, "Initial")
+        plot_route(best_initial_solution.route, environment, "Initial")
 
-    solution = initial_solution
+    solution = evaluate([list(initial_solution)], environment)[0]
     history = [(0, best_initial_solution)]
 
     for g in range(generations):
-        solution = next_generation(solution)
+        solution = next_generation(
+            solution, environment, move_type, selection, observer, g + 1
+        )
 
         if (g + 1) % eval_frequency == 0:
-            best_current_solution = evaluate([solution])[0]
+            best_current_solution = evaluate([list(solution.route)], environment)[0]
             history.append((g, best_current_solution))
             print(f"[{g+1}/{generations}] Distance: {best_current_solution.distance}")
 
             if show_plots:
-                plot_route(best_current_solution.route, f"Generation {g + 1}")
+                plot_route(
+                    best_current_solution.route, environment, f"Generation {g + 1}"
+                )
 
-    best_final_solution = evaluate([solution])[0]
+    best_final_solution = evaluate([solution.route], environment)[0]
     print(f"Final distance: {best_final_solution.distance}")
-    plot_history(history)
-    plot_route(best_final_solution.route, "Final solution")
+    if observer is not None:
+        observer.on_end({"best_distance": best_final_solution.distance})
+    if not headless:
+        plot_history(history, environment)
+        plot_route(best_final_solution.route, environment, "Final solution")
 
     return best_final_solution.route
 
 
-def main():
-    cities = initialize_random_environment()
+def main(headless: bool = False, observers: Optional[List[Observer]] = None):
+    environment = initialize_random_environment()
 
     best_route = solve(
-        cities,
+        environment,
         generations=50,
         eval_frequency=5,
         show_plots=False,
+        headless=headless,
+        observers=observers,
     )
 
 
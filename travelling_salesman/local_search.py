@@ -0,0 +1,268 @@
+from collections import deque
+from typing import List, Optional
+import math
+import random
+
+import numpy as np
+
+from common.instances import tsplib_distances
+from common.observers import Observer, combine, timed
+from travelling_salesman.plotting import plot_route
+from .construction import construct_route
+from .environment import Environment, initialize_random_environment
+
+IMPROVEMENT_THRESHOLD = 1e-9
+# Med TSPLIB-avstander slås kantene opp i avstandsmatrisen opp til så mange
+# byer. For større instanser beregnes hver kant for seg.
+MATRIX_CITIES = 2000
+
+
+def create_random_route(environment: Environment) -> List[int]:
+    route = random.sample(range(environment.num_cities), environment.num_cities)
+    return route
+
+
+def tour_length(route: List[int], environment: Environment) -> float:
+    # Regnes fra koordinatene, slik at vi slipper hele avstandsmatrisen
+    points = environment.coordinates[np.asarray(route)]
+    following = np.roll(points, -1, axis=0)
+    if environment.edge_weight_type is not None:
+        return float(
+            tsplib_distances(points, following, environment.edge_weight_type).sum()
+        )
+    return float(np.hypot(*(points - following).T).sum())
+
+
+def _reverse(tour: np.ndarray, pos: np.ndarray, i: int, j: int) -> None:
+    # Snur delruta fra posisjon i til j (syklisk). Snur den korteste siden,
+    # siden begge gir samme tur.
+    n = len(tour)
+    length = (j - i) % n + 1
+    if 2 * length > n:
+        i, j = (j + 1) % n, (i - 1) % n
+        length = n - length
+
+    if i <= j:
+        segment = tour[i : j + 1][::-1].copy()
+        tour[i : j + 1] = segment
+        pos[segment] = np.arange(i, j + 1)
+    else:
+        indices = np.arange(i, i + length) % n
+        segment = tour[indices][::-1].copy()
+        tour[indices] = segment
+        pos[segment] = indices
+
+
+def _move_segment(
+    tour: np.ndarray,
+    pos: np.ndarray,
+    start: int,
+    length: int,
+    after: int,
+    reverse: bool,
+) -> None:
+    # Flytter delruta som starter i byen start til rett etter byen after
+    n = len(tour)
+    rotated = np.roll(tour, -pos[start])
+    segment, rest = rotated[:length], rotated[length:]
+    k = (pos[after] - pos[start] - length) % n
+    new_tour = np.concatenate(
+        (rest[: k + 1], segment[::-1] if reverse else segment, rest[k + 1 :])
+    )
+    tour[:] = new_tour
+    pos[new_tour] = np.arange(n)
+
+
+def improve_route(
+    route: List[int],
+    environment: Environment,
+    num_neighbours: int = 8,
+    or_opt: bool = True,
+) -> List[int]:
+    n = len(route)
+    if n < 5:
+        return list(route)
+
+    xs = environment.coordinates[:, 0].tolist()
+    ys = environment.coordinates[:, 1].tolist()
+    neighbours = environment.nearest_neighbours(num_neighbours).tolist()
+
+    # Lokalsøket må bruke samme avstand som tour_length, ellers kan et
+    # «forbedrende» trekk gi en lengre tur
+    if environment.edge_weight_type is None:
+
+        def dist(a: int, b: int) -> float:
+            return math.hypot(xs[a] - xs[b], ys[a] - ys[b])
+
+    elif n <= MATRIX_CITIES:
+        matrix = environment.distance_matrix.tolist()
+
+        def dist(a: int, b: int) -> float:
+            return matrix[a][b]
+
+    else:
+        coordinates = environment.coordinates
+        edge_weight_type = environment.edge_weight_type
+
+        def dist(a: int, b: int) -> float:
+            return float(
+                tsplib_distances(coordinates[a], coordinates[b], edge_weight_type)
+            )
+
+    tour = np.array(route, dtype=np.int64)
+    pos = np.empty(n, dtype=np.int64)
+    pos[tour] = np.arange(n)
+    # Memoryviews gir raske oppslag av enkeltverdier i numpy-arrayene
+    t, p = memoryview(tour), memoryview(pos)
+
+    def succ(c: int) -> int:
+        return t[(p[c] + 1) % n]
+
+    def pred(c: int) -> int:
+        return t[p[c] - 1]
+
+    # Don't-look bits: bare byer i køen blir undersøkt
+    queue = deque(t.tolist())
+    active = [True] * n
+
+    def activate(*cities: int) -> None:
+        for c in cities:
+            if not active[c]:
+                active[c] = True
+                queue.append(c)
+
+    def try_two_opt(a: int) -> bool:
+        for forward in (True, False):
+            b = succ(a) if forward else pred(a)
+            d_ab = dist(a, b)
+            for c in neighbours[a]:
+                d_ac = dist(a, c)
+                if d_ac >= d_ab:
+                    break
+                d = succ(c) if forward else pred(c)
+                if c == b or d == a:
+                    continue
+                delta = d_ac + dist(b, d) - d_ab - dist(c, d)
+                if delta < -IMPROVEMENT_THRESHOLD:
+                    if forward:
+                        _reverse(tour, pos, p[b], p[c])
+                    else:
+                        _reverse(tour, pos, p[a], p[d])
+                    activate(a, b, c, d)
+                    return True
+        return False
+
+    def try_or_opt(a: int) -> bool:
+        for length in (1, 2, 3):
+            first = a
+            last = t[(p[a] + length - 1) % n]
+            before, after = pred(first), succ(last)
+            if before == after or n - length < 3:
+                continue
+            removal_gain = dist(before, first) + dist(last, after) - dist(before, after)
+            if removal_gain <= IMPROVEMENT_THRESHOLD:
+                continue
+
+            for end, other_end in ((first, last), (last, first)):
+                for c in neighbours[end]:
+                    d_c = dist(end, c)
+                    if d_c >= removal_gain:
+                        break
+                    if (p[c] - p[first]) % n < length:
+                        continue
+                    # Sett inn delruta mellom c og en av naboene til c,
+                    # med end ved siden av c
+                    for left, right in ((pred(c), c), (c, succ(c))):
+                        if (p[left] - p[first]) % n < length or (
+                            p[right] - p[first]
+                        ) % n < length:
+                            continue
+                        other = left if right == c else right
+                        delta = (
+                            d_c
+                            + dist(other_end, other)
+                            - dist(left, right)
+                            - removal_gain
+                        )
+                        if delta < -IMPROVEMENT_THRESHOLD:
+                            # Delruta går first -> last; snus hvis last skal
+                            # ligge først etter left
+                            reverse = (left == c) != (end == first)
+                            _move_segment(tour, pos, first, length, left, reverse)
+                            activate(before, after, first, last, left, right)
+                            return True
+        return False
+
+    while queue:
+        a = queue.popleft()
+        active[a] = False
+        if not try_two_opt(a) and or_opt:
+            try_or_opt(a)
+
+    return tour.tolist()
+
+
+def solve(
+    environment: Environment,
+    num_neighbours: int = 8,
+    or_opt: bool = True,
+    show_plots: bool = True,
+    headless: bool = False,
+    observers: Optional[List[Observer]] = None,
+    seeding: str = "random",
+) -> List[int]:
+    show_plots = show_plots and not headless
+    observer = combine(observers)
+    if observer is not None:
+        observer.on_start(
+            "tsp_ls",
+            dict(
+                num_cities=environment.num_cities,
+                num_neighbours=num_neighbours,
+                or_opt=or_opt,
+            ),
+        )
+
+    # Startløsningen kan bygges med en konstruksjonsheuristikk i stedet
+    if seeding == "random":
+        initial_solution = create_random_route(environment)
+    else:
+        initial_solution = construct_route(environment, seeding)
+    print(f"Initial distance: {tour_length(initial_solution, environment)}")
+    if show_plots:
+        plot_route(initial_solution, environment, "Initial")
+
+    solution = timed(
+        observer,
+        "improve",
+        improve_route,
+        initial_solution,
+        environment,
+        num_neighbours,
+        or_opt,
+    )
+
+    print(f"Final distance: {tour_length(solution, environment)}")
+    if observer is not None:
+        observer.on_end({"best_distance": tour_length(solution, environment)})
+    if not headless:
+        plot_route(solution, environment, "Final solution")
+
+    return solution
+
+
+def main(headless: bool = False, observers: Optional[List[Observer]] = None):
+    environment = initialize_random_environment(num_cities=1000)
+
+    best_route = solve(
+        environment,
+        num_neighbours=8,
+        or_opt=True,
+        show_plots=False,
+        headless=headless,
+        observers=observers,
+    )
+
+
+if __name__ == "__main__":
+    main()
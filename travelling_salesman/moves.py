@@ -0,0 +1,205 @@
+import random
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .environment import Environment
+
+Move = Tuple[int, int]
+
+MOVE_TYPES = ("swap", "2opt", "insertion")
+
+# Trekktypene som kan gjøres for mange ruter samtidig
+BATCH_MOVE_TYPES = ("swap", "2opt")
+
+
+def swap_delta(route: List[int], move: Move, environment: Environment) -> float:
+    distances = environment.distance_matrix
+    n = len(route)
+    i, j = sorted(move)
+
+    def city_after_swap(k: int) -> int:
+        k %= n
+        if k == i:
+            return route[j]
+        if k == j:
+            return route[i]
+        return route[k]
+
+    # Kant k går fra posisjon k til k + 1. Bare kantene rundt i og j endres.
+    delta = 0.0
+    for k in {(i - 1) % n, i, (j - 1) % n, j}:
+        delta += distances[city_after_swap(k), city_after_swap(k + 1)]
+        delta -= distances[route[k], route[(k + 1) % n]]
+    return delta
+
+
+def two_opt_delta(route: List[int], move: Move, environment: Environment) -> float:
+    distances = environment.distance_matrix
+    n = len(route)
+    i, j = sorted(move)
+    if i == 0 and j == n - 1:
+        return 0.0
+
+    a, b = route[i - 1], route[i]
+    c, d = route[j], route[(j + 1) % n]
+    return distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+
+
+def insertion_delta(route: List[int], move: Move, environment: Environment) -> float:
+    distances = environment.distance_matrix
+    n = len(route)
+    i, j = move
+    if i == j:
+        return 0.0
+
+    city = route[i]
+    prev_city, next_city = route[i - 1], route[(i + 1) % n]
+    delta = (
+        distances[prev_city, next_city]
+        - distances[prev_city, city]
+        - distances[city, next_city]
+    )
+
+    # Indekser i ruta etter at byen er fjernet
+    def remaining(k: int) -> int:
+        k %= n - 1
+        return route[k] if k < i else route[k + 1]
+
+    left, right = remaining(j - 1), remaining(j)
+    delta += distances[left, city] + distances[city, right] - distances[left, right]
+    return delta
+
+
+def apply_swap(route: List[int], move: Move) -> None:
+    i, j = move
+    route[i], route[j] = route[j], route[i]
+
+
+def apply_two_opt(route: List[int], move: Move) -> None:
+    i, j = sorted(move)
+    route[i : j + 1] = route[i : j + 1][::-1]
+
+
+def apply_insertion(route: List[int], move: Move) -> None:
+    i, j = move
+    route.insert(j, route.pop(i))
+
+
+DELTA_FUNCTIONS = {
+    "swap": swap_delta,
+    "2opt": two_opt_delta,
+    "insertion": insertion_delta,
+}
+
+APPLY_FUNCTIONS = {
+    "swap": apply_swap,
+    "2opt": apply_two_opt,
+    "insertion": apply_insertion,
+}
+
+
+def iterate_moves(
+    num_cities: int, move_type: str = "swap", start: int = 0
+) -> Iterator[Move]:
+    if move_type not in MOVE_TYPES:
+        raise ValueError(f"Unknown move type: {move_type}")
+
+    for offset in range(num_cities):
+        i = (start + offset) % num_cities
+        if move_type == "swap":
+            if i < num_cities - 1:
+                yield i, i + 1
+        elif move_type == "2opt":
+            for j in range(i + 1, num_cities):
+                if not (i == 0 and j == num_cities - 1):
+                    yield i, j
+        elif move_type == "insertion":
+            for j in range(num_cities):
+                if j != i:
+                    yield i, j
+
+
+def random_move(num_cities: int, move_type: str = "swap") -> Move:
+    if move_type == "swap":
+        i = random.randrange(num_cities - 1)
+        return i, i + 1
+    elif move_type == "2opt":
+        while True:
+            i, j = sorted(random.sample(range(num_cities), 2))
+            if not (i == 0 and j == num_cities - 1):
+                return i, j
+    elif move_type == "insertion":
+        i, j = random.sample(range(num_cities), 2)
+        return i, j
+    raise ValueError(f"Unknown move type: {move_type}")
+
+
+def move_delta(
+    route: List[int], move: Move, environment: Environment, move_type: str = "swap"
+) -> float:
+    return DELTA_FUNCTIONS[move_type](route, move, environment)
+
+
+def apply_move(route: List[int], move: Move, move_type: str = "swap") -> None:
+    APPLY_FUNCTIONS[move_type](route, move)
+
+
+def random_moves(
+    num_routes: int,
+    num_cities: int,
+    move_type: str = "swap",
+    rng: Optional[np.random.Generator] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    rng = rng or np.random.default_rng()
+    if move_type == "swap":
+        i = rng.integers(0, num_cities - 1, num_routes)
+        return i, i + 1
+    elif move_type == "2opt":
+        a = rng.integers(0, num_cities, num_routes)
+        b = rng.integers(0, num_cities - 1, num_routes)
+        b += b >= a
+        return np.minimum(a, b), np.maximum(a, b)
+    raise ValueError(f"Unknown batch move type: {move_type}")
+
+
+def move_deltas(
+    routes: np.ndarray,
+    i: np.ndarray,
+    j: np.ndarray,
+    environment: Environment,
+    move_type: str = "swap",
+) -> np.ndarray:
+    distances = environment.distance_matrix
+    rows = np.arange(len(routes))
+    n = routes.shape[1]
+    a, b = routes[rows, i - 1], routes[rows, i]
+    c, d = routes[rows, j], routes[rows, (j + 1) % n]
+
+    if move_type == "swap":
+        # Naboer byttes: a b c d -> a c b d
+        return distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+    elif move_type == "2opt":
+        delta = distances[a, c] + distances[b, d] - distances[a, b] - distances[c, d]
+        # Å snu hele ruta gir samme tur
+        return np.where((i == 0) & (j == n - 1), 0.0, delta)
+    raise ValueError(f"Unknown batch move type: {move_type}")
+
+
+def apply_moves(
+    routes: np.ndarray,
+    rows: np.ndarray,
+    i: np.ndarray,
+    j: np.ndarray,
+    move_type: str = "swap",
+) -> None:
+    i, j = i[rows], j[rows]
+    if move_type == "swap":
+        routes[rows, i], routes[rows, j] = routes[rows, j], routes[rows, i]
+    elif move_type == "2opt":
+        positions = np.arange(routes.shape[1])
+        inside = (positions >= i[:, np.newaxis]) & (positions <= j[:, np.newaxis])
+        order = np.where(inside, (i + j)[:, np.newaxis] - positions, positions)
+        routes[rows] = np.take_along_axis(routes[rows], order, axis=1)
+    else:
+        raise ValueError(f"Unknown batch move type: {move_type}")
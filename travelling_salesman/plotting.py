@@ -1,18 +1,29 @@
 from typing import List, Tuple
 import math
-import matplotlib.pyplot as plt
-import seaborn as sns
-from .environment import Fitness
+import numpy as np
+from common.plotting import pyplot
+from .environment import Environment, Fitness
 
-sns.set()
 
+def draw_route(ax, route, environment: Environment) -> None:
+    # Hele ruta tegnes som én linje og byene som ett punktsett, i stedet for
+    # ett kall per by
+    points = environment.coordinates[np.asarray(route)]
+    closed = np.vstack((points, points[:1]))
+    ax.plot(closed[:, 0], closed[:, 1], c="black", zorder=1)
+    ax.scatter(points[:, 0], points[:, 1], c="red", zorder=2)
 
-def plot_route(route, title=None) -> None:
-    for i in range(len(route)):
-        city = route[i]
-        next_city = route[(i + 1) % len(route)]
-        plt.scatter(city.x, city.y, c="red")
-        plt.plot((city.x, next_city.x), (city.y, next_city.y), c="black")
+
+def draw_route_frame(figure, route, environment: Environment, title=None) -> None:
+    ax = figure.add_subplot()
+    draw_route(ax, route, environment)
+    if title:
+        ax.set_title(title)
+
+
+def plot_route(route, environment: Environment, title=None) -> None:
+    plt = pyplot()
+    draw_route(plt.gca(), route, environment)
 
     if title:
         plt.title(title)
@@ -20,7 +31,9 @@ def plot_route(route, title=None) -> None:
     plt.show()
 
 
-def plot_history(history: Tuple[int, List[Fitness]]) -> None:
+def plot_history(history: List[Tuple[int, Fitness]], environment: Environment) -> None:
+    plt = pyplot()
+
     # Plot score history
     fig, ax1 = plt.subplots(figsize=(8, 6))
     ax1.set_title("Score history")
@@ -40,17 +53,10 @@ def plot_history(history: Tuple[int, List[Fitness]]) -> None:
     cols = min(len(history), 5)
     rows = math.ceil(len(history) / 5)
     fix, axes = plt.subplots(rows, cols, figsize=(15, 10))
-    axes = axes.flatten()
+    axes = np.asarray(axes).flatten()
 
-    for i, gen in enumerate(history):
-        ax = axes[i]
+    for ax, gen in zip(axes, history):
         ax.set_title(f"Generation {gen[0] + 1}")
-        route = gen[1].route
-
-        for i in range(len(route)):
-            city = route[i]
-            next_city = route[(i + 1) % len(route)]
-            ax.scatter(city.x, city.y, c="red")
-            ax.plot((city.x, next_city.x), (city.y, next_city.y), c="black")
+        draw_route(ax, gen[1].route, environment)
 
     plt.show()
@@ -0,0 +1,141 @@
+import math
+from typing import Optional, Union
+
+import numpy as np
+
+from .environment import Environment
+from .moves import move_deltas, random_moves
+
+
+def expit(x: np.ndarray) -> np.ndarray:
+    # Logistisk funksjon som scipy.special.expit, så annealing ikke laster
+    # scipy. exp får aldri et positivt argument, og kan dermed ikke flyte over.
+    x = np.asarray(x, dtype=float)
+    e = np.exp(-np.abs(x))
+    return np.where(x >= 0, 1 / (1 + e), e / (1 + e))
+
+
+def sample_fitness_changes(
+    environment: Environment,
+    sample_size: int = 1000,
+    move_type: str = "swap",
+    rng: Optional[np.random.Generator] = None,
+) -> np.ndarray:
+    # Endringen i 1 / distance for tilfeldige trekk fra tilfeldige ruter
+    rng = rng or np.random.default_rng()
+    routes = np.argsort(rng.random((sample_size, environment.num_cities)), axis=1)
+    distances = environment.route_lengths(routes)
+    i, j = random_moves(sample_size, environment.num_cities, move_type, rng)
+    deltas = move_deltas(routes, i, j, environment, move_type)
+    return 1 / (distances + deltas) - 1 / distances
+
+
+def calibrate_temperature(
+    fitness_changes: np.ndarray, target_acceptance: float = 0.4
+) -> float:
+    # expit gir aldri over 50 % sannsynlighet for et dårligere trekk
+    if not 0 < target_acceptance < 0.5:
+        raise ValueError("target_acceptance must be between 0 and 0.5")
+
+    worsening = fitness_changes[fitness_changes < 0]
+    if len(worsening) == 0:
+        raise ValueError("No worsening moves in the sample")
+
+    # Andelen aksepterte trekk øker med temperaturen, så vi kan halvere
+    # intervallet (på log-skala) til vi treffer målet
+    magnitudes = np.abs(worsening)
+    low, high = math.log(magnitudes.min()) - 10, math.log(magnitudes.max()) + 10
+    for _ in range(100):
+        mid = (low + high) / 2
+        if expit(worsening / math.exp(mid)).mean() < target_acceptance:
+            low = mid
+        else:
+            high = mid
+    return math.exp((low + high) / 2)
+
+
+class AdaptiveSchedule:
+    def __init__(
+        self,
+        initial_temperature: float,
+        generations: int,
+        target_acceptance: float = 0.4,
+        final_acceptance: float = 0.001,
+        window: int = 100,
+        max_change: float = 2.0,
+        stagnation_limit: Optional[int] = None,
+        reheat_fraction: float = 0.5,
+    ) -> None:
+        self.initial_temperature = initial_temperature
+        self.temperature = initial_temperature
+        self.generations = generations
+        self.target_acceptance = target_acceptance
+        self.final_acceptance = final_acceptance
+        self.window = window
+        self.max_change = max_change
+        self.stagnation_limit = stagnation_limit or generations // 10
+        self.reheat_fraction = reheat_fraction
+
+        self.cooling_rate = 1.0
+        self.step = 0
+        self.worsening = 0
+        self.accepted = 0
+        self.since_improvement = 0
+        self.reheats = 0
+
+    @classmethod
+    def calibrated(
+        cls,
+        environment: Environment,
+        generations: int,
+        target_acceptance: float = 0.4,
+        move_type: str = "swap",
+        sample_size: int = 1000,
+        seed: Optional[int] = None,
+        **kwargs,
+    ) -> "AdaptiveSchedule":
+        fitness_changes = sample_fitness_changes(
+            environment, sample_size, move_type, np.random.default_rng(seed)
+        )
+        temperature = calibrate_temperature(fitness_changes, target_acceptance)
+        return cls(temperature, generations, target_acceptance, **kwargs)
+
+    def target(self) -> float:
+        # Ønsket akseptrate synker eksponentielt gjennom kjøringen
+        progress = min(self.step / self.generations, 1.0)
+        ratio = self.final_acceptance / self.target_acceptance
+        return self.target_acceptance * ratio**progress
+
+    def __call__(self, t: int) -> float:
+        return self.temperature
+
+    def update(
+        self,
+        worsening: Union[bool, np.ndarray],
+        accepted: Union[bool, np.ndarray],
+        improved: bool,
+    ) -> None:
+        # Akseptraten måles bare på trekk som ikke forbedrer løsningen
+        self.worsening += np.count_nonzero(worsening)
+        self.accepted += np.count_nonzero(np.logical_and(worsening, accepted))
+        self.step += 1
+        self.temperature *= self.cooling_rate
+
+        if self.step % self.window == 0 and self.worsening > 0:
+            # Kjøler raskere når for mange dårlige trekk aksepteres, og
+            # saktere når for få gjør det
+            observed = max(self.accepted / self.worsening, 1e-6)
+            change = np.clip(
+                self.target() / observed, 1 / self.max_change, self.max_change
+            )
+            self.cooling_rate = change ** (1 / self.window)
+            self.worsening = self.accepted = 0
+
+        self.since_improvement = 0 if improved else self.since_improvement + 1
+        if self.since_improvement >= self.stagnation_limit:
+            self.temperature = max(
+                self.temperature, self.initial_temperature * self.reheat_fraction
+            )
+            self.cooling_rate = 1.0
+            self.since_improvement = 0
+            self.reheats += 1
@@ -1,47 +1,84 @@
-from typing import List
+from typing import Iterator, List, Optional, Tuple
+import math
 import random
-from scipy.special import expit
+import numpy as np
+from common.genome import smallest_int_dtype
+from common.observers import Observer, combine, timed
 from travelling_salesman.plotting import plot_history, plot_route
-from .environment import City, Fitness, initialize_random_environment
+from .construction import construct_route
+from .environment import Environment, Fitness, initialize_random_environment
+from .schedules import AdaptiveSchedule, expit
+from .moves import (
+    Move,
+    apply_move,
+    apply_moves,
+    move_delta,
+    move_deltas,
+    random_move,
+    random_moves,
+)
 
 
-def create_random_route(cities: List[City]) -> List[City]:
-    route = random.sample(cities, len(cities))
+def create_random_route(environment: Environment) -> List[int]:
+    route = random.sample(range(environment.num_cities), environment.num_cities)
     return route
 
 
-def get_neighbours(solution: List[City]) -> List[List[City]]:
-    neighbours = []
+def get_neighbours(
+    solution: List[int], environment: Environment, move_type: str = "swap"
+) -> Iterator[Tuple[Move, float]]:
+    # Naboer trekkes tilfeldig og evalueres først når de trengs
+    while True:
+        move = random_move(len(solution), move_type)
+        yield move, move_delta(solution, move, environment, move_type)
 
-    for i in range(len(solution) - 1):
-        neighbour = [x for x in solution]
-        neighbour[i], neighbour[i + 1] = neighbour[i + 1], neighbour[i]
-        neighbours.append(neighbour)
 
-    return neighbours
+def evaluate(solutions: List[List[int]], environment: Environment) -> List[Fitness]:
+    return [Fitness(x, environment) for x in solutions]
 
 
-def evaluate(solutions: List[List[City]]) -> List[Fitness]:
-    return [Fitness(x) for x in solutions]
+def select(
+    current_solution: Fitness, neighbours: Iterator[Tuple[Move, float]], temp: float
+) -> Tuple[Optional[Move], float]:
+    move, delta = next(neighbours)
+    # Verdiene gjøres om til float, så deling med numpy-skalarer ikke gir
+    # advarsler når temperaturen blir svært lav
+    fitness = float(current_solution.fitness)
+    next_fitness = 1 / (float(current_solution.distance) + float(delta))
+    if next_fitness > fitness:
+        return move, delta
 
+    # Når temperaturen har nådd 0, godtas bare forbedringer
+    if temp <= 0:
+        return None, 0.0
 
-def select(current_solution: Fitness, solutions: List[Fitness], temp: float) -> Fitness:
-    next_solution = random.sample(solutions, 1)[0]
-    if next_solution.fitness > current_solution.fitness:
-        return next_solution
-    elif random.random() < expit(
-        (next_solution.fitness - current_solution.fitness) / temp
-    ):
-        return next_solution
-    return current_solution
+    # Trekket er dårligere, så eksponenten er ikke positiv og exp kan ikke flyte
+    # over. math er mye raskere enn numpy for enkeltverdier.
+    acceptance = math.exp((next_fitness - fitness) / float(temp))
+    if random.random() < acceptance / (1 + acceptance):
+        return move, delta
+    return None, 0.0
 
 
-def next_generation(cur_solution: List[City], temp: float) -> List[City]:
-    neighbours = get_neighbours(cur_solution)
-    fitness = evaluate(neighbours)
-    next_gen = select(Fitness(cur_solution), fitness, temp)
+def next_generation(
+    cur_solution: Fitness,
+    environment: Environment,
+    temp: float,
+    move_type: str = "swap",
+    observer: Optional[Observer] = None,
+) -> Fitness:
+    neighbours = get_neighbours(cur_solution.route, environment, move_type)
+    # Trekkene er så raske at tidtakingen bare gjøres når noen observerer
+    if observer is None:
+        move, delta = select(cur_solution, neighbours, temp)
+    else:
+        move, delta = timed(observer, "select", select, cur_solution, neighbours, temp)
+    if move is None:
+        return cur_solution
 
-    return next_gen.route
+    # Ruta endres på stedet i stedet for å kopieres
+    apply_move(cur_solution.route, move, move_type)
+    return Fitness(cur_solution.route, environment, cur_solution.distance + delta)
 
 
 def exponential_multiplicative_decay(initial_value, decay):
@@ -53,53 +90,314 @@ def linear_decay(initial_value, slope):
 
 
 def solve(
-    cities: List[City],
+    environment: Environment,
     generations: int = 500,
     eval_frequency: int = 50,
     show_plots: bool = True,
     temperature_function=None,
-) -> Fitness:
+    move_type: str = "swap",
+    headless: bool = False,
+    observers: Optional[List[Observer]] = None,
+    seeding: str = "random",
+) -> List[int]:
+    show_plots = show_plots and not headless
+    if temperature_function == None:
+        temperature_function = exponential_multiplicative_decay(40, 0.95)
+    observer = combine(observers)
+    if observer is not None:
+        observer.on_start(
+            "tsp_sa",
+            dict(
+                num_cities=environment.num_cities,
+                generations=generations,
+                move_type=move_type,
+            ),
+        )
+
+    if seeding == "random":
+        initial_solution = create_random_route(environment)
+    else:
+        initial_solution = construct_route(environment, seeding)
+    best_initial_solution = evaluate([initial_solution], environment)[0]
+    print(f"Initial distance: {best_initial_solution.distance}")
+    if show_plots:
+        plot_route(best_initial_solution.route, environment, "Initial")
+
+    solution = evaluate([list(initial_solution)], environment)[0]
+    history = [(0, best_initial_solution)]
+
+    # Adaptive temperaturplaner får vite hvordan hvert trekk gikk
+    adaptive = hasattr(temperature_function, "update")
+    best_distance = solution.distance
+
+    for g in range(generations):
+        temp = temperature_function(g)
+        previous_distance = solution.distance
+        next_solution = next_generation(
+            solution, environment, temp, move_type, observer
+        )
+        if observer is not None:
+            observer.on_generation(
+                g + 1,
+                {
+                    "distance": next_solution.distance,
+                    "temperature": temp,
+                    "accepted": int(next_solution is not solution),
+                    "evaluations": 1,
+                },
+            )
+
+        if adaptive:
+            accepted = next_solution is not solution
+            worsening = not accepted or next_solution.distance >= previous_distance
+            improved = next_solution.distance < best_distance
+            best_distance = min(best_distance, next_solution.distance)
+            temperature_function.update(worsening, accepted, improved)
+        solution = next_solution
+
+        if (g + 1) % eval_frequency == 0:
+            best_current_solution = evaluate([list(solution.route)], environment)[0]
+            history.append((g, best_current_solution))
+            print(f"[{g+1}/{generations}] Distance: {best_current_solution.distance}")
+
+            if show_plots:
+                plot_route(
+                    best_current_solution.route, environment, f"Generation {g + 1}"
+                )
+
+    best_final_solution = evaluate([solution.route], environment)[0]
+    print(f"Final distance: {best_final_solution.distance}")
+    if observer is not None:
+        observer.on_end({"best_distance": best_final_solution.distance})
+    if not headless:
+        plot_history(history, environment)
+        plot_route(best_final_solution.route, environment, "Final solution")
+
+    return best_final_solution.route
+
+
+def random_routes(
+    num_routes: int, num_cities: int, rng: np.random.Generator
+) -> np.ndarray:
+    routes = np.argsort(rng.random((num_routes, num_cities)), axis=1)
+    return routes.astype(smallest_int_dtype(0, num_cities - 1))
+
+
+def accept_moves(
+    distances: np.ndarray,
+    deltas: np.ndarray,
+    temps: np.ndarray,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    # Samme akseptkriterium som select, bare for alle kjedene samtidig
+    fitness_change = 1 / (distances + deltas) - 1 / distances
+    # Kjeder med temperatur 0 godtar bare forbedringer. Svært lave
+    # temperaturer gir uendelige eksponenter, som expit håndterer.
+    exponent = np.full_like(fitness_change, -np.inf)
+    with np.errstate(over="ignore"):
+        np.divide(fitness_change, temps, out=exponent, where=temps > 0)
+    probabilities = expit(exponent)
+    return (fitness_change > 0) | (rng.random(len(distances)) < probabilities)
+
+
+def swap_temperatures(
+    ladder: np.ndarray,
+    distances: np.ndarray,
+    temp: float,
+    offset: int,
+    rng: np.random.Generator,
+) -> None:
+    # Kjeder med nabotemperaturer bytter temperatur med sannsynlighet
+    # min(1, exp((f_j - f_i) * (1 / T_i - 1 / T_j)))
+    if temp <= 0:
+        return
+
+    order = np.argsort(ladder)
+    first, second = order[offset:-1:2], order[offset + 1 :: 2]
+    fitness = 1 / distances
+    # Temperaturen deles ut til slutt, så en svært lav temperatur gir en
+    # uendelig verdi i stedet for inf - inf
+    with np.errstate(over="ignore"):
+        log_ratio = (
+            (fitness[second] - fitness[first])
+            * (1 / ladder[first] - 1 / ladder[second])
+            / temp
+        )
+    swap = np.log(rng.random(len(first))) < log_ratio
+    first, second = first[swap], second[swap]
+    ladder[first], ladder[second] = ladder[second], ladder[first]
+
+
+def solve_chains(
+    environment: Environment,
+    chains: int = 256,
+    generations: int = 500,
+    eval_frequency: int = 50,
+    show_plots: bool = True,
+    temperature_function=None,
+    move_type: str = "swap",
+    tempering: bool = False,
+    max_temperature_ratio: float = 10.0,
+    swap_frequency: int = 100,
+    seed: Optional[int] = None,
+    headless: bool = False,
+    observers: Optional[List[Observer]] = None,
+) -> List[int]:
+    show_plots = show_plots and not headless
     if temperature_function == None:
         temperature_function = exponential_multiplicative_decay(40, 0.95)
+    rng = np.random.default_rng(seed)
+    observer = combine(observers)
+    if observer is not None:
+        observer.on_start(
+            "tsp_sa_chains",
+            dict(
+                num_cities=environment.num_cities,
+                chains=chains,
+                generations=generations,
+                move_type=move_type,
+                tempering=tempering,
+            ),
+        )
+
+    # Alle kjedene lagres i én matrise og flyttes i takt
+    routes = random_routes(chains, environment.num_cities, rng)
+    distances = environment.route_lengths(routes)
+    best_routes, best_distances = routes.copy(), distances.copy()
 
-    initial_solution = create_random_route(cities)
-    best_initial_solution = evaluate([initial_solution])[0]
+    best_initial_solution = Fitness(
+        routes[np.argmin(distances)].tolist(), environment, distances.min()
+    )
     print(f"Initial distance: {best_initial_solution.distance}")
     if show_plots:
-        plot_route(best_initial_solution, "Initial")
+        plot_route(best_initial_solution.route, environment, "Initial")
 
-    solution = initial_solution
     history = [(0, best_initial_solution)]
 
+    # Ved parallel tempering får hver kjede sin egen faktor på temperaturen
+    if tempering:
+        ladder = np.geomspace(1, max_temperature_ratio, chains)
+    else:
+        ladder = np.ones(chains)
+    adaptive = hasattr(temperature_function, "update")
+
     for g in range(generations):
         temp = temperature_function(g)
-        solution = next_generation(solution, temp)
+        i, j = timed(
+            observer,
+            "propose",
+            random_moves,
+            chains,
+            environment.num_cities,
+            move_type,
+            rng,
+        )
+        deltas = timed(
+            observer, "evaluate", move_deltas, routes, i, j, environment, move_type
+        )
+        accepted = timed(
+            observer, "accept", accept_moves, distances, deltas, temp * ladder, rng
+        )
+        rows = np.flatnonzero(accepted)
+        timed(observer, "apply", apply_moves, routes, rows, i, j, move_type)
+        distances[rows] += deltas[rows]
+
+        improved = np.flatnonzero(distances < best_distances)
+        if adaptive:
+            global_improvement = distances[improved].min(initial=np.inf)
+            temperature_function.update(
+                deltas >= 0, accepted, global_improvement < best_distances.min()
+            )
+        best_routes[improved] = routes[improved]
+        best_distances[improved] = distances[improved]
+
+        if tempering and (g + 1) % swap_frequency == 0:
+            offset = (g + 1) // swap_frequency % 2
+            swap_temperatures(ladder, distances, temp, offset, rng)
+
+        if observer is not None:
+            observer.on_generation(
+                g + 1,
+                {
+                    "best_distance": float(best_distances.min()),
+                    "mean_distance": float(distances.mean()),
+                    "temperature": temp,
+                    "acceptance_rate": len(rows) / chains,
+                    "evaluations": chains,
+                },
+            )
 
         if (g + 1) % eval_frequency == 0:
-            best_current_solution = evaluate([solution])[0]
+            # Regner avstandene på nytt så avrundingsfeil ikke hoper seg opp
+            distances = environment.route_lengths(routes)
+            best = np.argmin(best_distances)
+            best_current_solution = Fitness(
+                best_routes[best].tolist(), environment, best_distances[best]
+            )
             history.append((g, best_current_solution))
             print(f"[{g+1}/{generations}] Distance: {best_current_solution.distance}")
 
             if show_plots:
-                plot_route(best_current_solution.route, f"Generation {g + 1}")
+                plot_route(
+                    best_current_solution.route, environment, f"Generation {g + 1}"
+                )
 
-    best_final_solution = evaluate([solution])[0]
+    best = np.argmin(best_distances)
+    best_final_solution = evaluate([best_routes[best].tolist()], environment)[0]
     print(f"Final distance: {best_final_solution.distance}")
-    plot_history(history)
-    plot_route(best_final_solution.route, "Final solution")
+    if observer is not None:
+        observer.on_end({"best_distance": best_final_solution.distance})
+    if not headless:
+        plot_history(history, environment)
+        plot_route(best_final_solution.route, environment, "Final solution")
 
     return best_final_solution.route
 
 
-def main():
-    cities = initialize_random_environment()
+def main(headless: bool = False, observers: Optional[List[Observer]] = None):
+    environment = initialize_random_environment()
 
     best_route = solve(
-        cities,
-        generations=2500,
-        eval_frequency=200,
+        environment,
+        generations=250000,
+        eval_frequency=25000,
+        show_plots=False,
+        temperature_function=linear_decay(100, 0.0005),
+        headless=headless,
+        observers=observers,
+    )
+
+
+def main_adaptive(headless: bool = False, observers: Optional[List[Observer]] = None):
+    environment = initialize_random_environment()
+
+    # Starttemperaturen kalibreres fra et utvalg av trekk i stedet for å
+    # stilles inn for hånd
+    generations = 50000
+    best_route = solve(
+        environment,
+        generations=generations,
+        eval_frequency=5000,
+        show_plots=False,
+        temperature_function=AdaptiveSchedule.calibrated(environment, generations),
+        headless=headless,
+        observers=observers,
+    )
+
+
+def main_chains(headless: bool = False, observers: Optional[List[Observer]] = None):
+    environment = initialize_random_environment()
+
+    best_route = solve_chains(
+        environment,
+        chains=256,
+        generations=25000,
+        eval_frequency=2500,
         show_plots=False,
-        temperature_function=linear_decay(100, 0.05),
+        temperature_function=linear_decay(100, 0.005),
+        tempering=True,
+        headless=headless,
+        observers=observers,
     )
 
 
@@ -1,20 +1,25 @@
+import math
 import random
-from typing import List
+from typing import List, Optional, Sequence, Tuple
 
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-sns.set()
+from common.checkpoint import load_checkpoint
+from common.genome import smallest_int_dtype
+from common.instances import load_instance, tsplib_distance_matrix
 
 
 OVERFILLED_VEHICLE_PENALTY = 250
 
 
 class City:
-    def __init__(self, x: float, y: float) -> None:
+    # Uten __dict__ tar hver by bare plass til koordinatene og etterspørselen
+    __slots__ = ("x", "y", "demand")
+
+    def __init__(self, x: float, y: float, demand: int = 1) -> None:
         self.x = x
         self.y = y
+        self.demand = demand
 
     def distance(self, city) -> float:
         return np.sqrt((self.x - city.x) ** 2 + (self.y - city.y) ** 2)
@@ -27,17 +32,237 @@ class Environment:
     def __init__(
         self, num_cities=25, num_vehicles=5, vehicle_capacity=10, seed=None
     ) -> None:
-        random.seed(seed)
+        # Egen generator, slik at samme seed gir samme instans uten å endre den
+        # globale tilstanden til random
+        rng = random.Random(seed)
 
-        self.cities = [
-            City(x=random.randint(0, 200), y=random.randint(0, 200))
+        cities = [
+            City(x=rng.randint(0, 200), y=rng.randint(0, 200))
             for _ in range(num_cities)
         ]
 
-        self.depot = City(x=random.randint(70, 130), y=random.randint(70, 130))
+        depot = City(x=rng.randint(70, 130), y=rng.randint(70, 130))
+
+        self._initialize(cities, depot, num_vehicles, vehicle_capacity)
+
+    @classmethod
+    def from_coordinates(
+        cls,
+        coordinates,
+        num_vehicles,
+        vehicle_capacity,
+        demands=None,
+        edge_weight_type=None,
+    ):
+        # Første rad er depotet, som i self.coordinates. Uten demands har hver
+        # by etterspørsel 1.
+        environment = cls.__new__(cls)
+        coordinates = np.asarray(coordinates, dtype=float).tolist()
+        if demands is None:
+            demands = [1] * (len(coordinates) - 1)
+        depot = City(*coordinates[0], demand=0)
+        cities = [
+            City(x=x, y=y, demand=d)
+            for (x, y), d in zip(coordinates[1:], np.asarray(demands).tolist())
+        ]
+        environment._initialize(
+            cities, depot, num_vehicles, vehicle_capacity, edge_weight_type
+        )
+        return environment
+
+    def _initialize(
+        self, cities, depot, num_vehicles, vehicle_capacity, edge_weight_type=None
+    ):
+        self.cities = cities
+        self.depot = depot
 
         self.num_vehicles = num_vehicles
         self.vehicle_capacity = vehicle_capacity
+        # Byene er genene 0..n-1 og skillene mellom bilene -1..-(biler - 1)
+        self.genome_dtype = smallest_int_dtype(-(num_vehicles - 1), len(cities) - 1)
+
+        # Depotet har indeks 0, by i har indeks i + 1
+        self.coordinates = np.array(
+            [(c.x, c.y) for c in [self.depot] + self.cities], dtype=float
+        )
+        self.edge_weight_type = edge_weight_type
+        self._distance_matrix = None
+        self._distance_table = None
+
+        # Etterspørselen per node, med 0 for depotet. Når alle byene har
+        # etterspørsel 1 er lasten bare antall byer, og det regnes ut raskere.
+        self.demands = np.array([0] + [c.demand for c in self.cities])
+        self.demand_table = self.demands.tolist()
+        self.unit_demands = bool(np.all(self.demands[1:] == 1))
+
+    @property
+    def distance_matrix(self) -> np.ndarray:
+        # Beregnes først ved behov, siden matrisen blir stor for mange byer
+        if self._distance_matrix is None:
+            if self.edge_weight_type is None:
+                self._distance_matrix = calculate_distance_matrix(self.coordinates)
+            else:
+                self._distance_matrix = tsplib_distance_matrix(
+                    self.coordinates, self.edge_weight_type
+                )
+        return self._distance_matrix
+
+    def __getstate__(self):
+        # Listeutgaven av matrisen lages på nytt ved behov i stedet for å
+        # sendes til andre prosesser
+        return {**self.__dict__, "_distance_table": None}
+
+    @property
+    def distance_table(self) -> List[List[float]]:
+        # Lister gir raskere enkeltoppslag enn matrisen i evaluate_chromosome,
+        # men lages bare når den brukes
+        if self._distance_table is None:
+            self._distance_table = self.distance_matrix.tolist()
+        return self._distance_table
+
+
+def calculate_distance_matrix(coordinates: np.ndarray) -> np.ndarray:
+    dx = coordinates[:, np.newaxis, 0] - coordinates[np.newaxis, :, 0]
+    dy = coordinates[:, np.newaxis, 1] - coordinates[np.newaxis, :, 1]
+    return np.hypot(dx, dy)
+
+
+def evaluate_chromosome(
+    chromosome: Sequence[int], environment: Environment
+) -> Tuple[List[float], List[int], float, float]:
+    distances = environment.distance_table
+    demands = environment.demand_table
+    if isinstance(chromosome, np.ndarray):
+        # Python-heltall, så int16-gener ikke flyter over i gene + 1
+        chromosome = chromosome.tolist()
+    capacity = environment.vehicle_capacity
+    route_lengths = []
+    loads = []
+    penalty = 0.0
+
+    length, load, previous = 0.0, 0, 0
+    for gene in chromosome:
+        if gene < 0:
+            route_lengths.append(length + distances[previous][0])
+            loads.append(load)
+            if load > capacity:
+                penalty += OVERFILLED_VEHICLE_PENALTY * (load - capacity)
+            length, load, previous = 0.0, 0, 0
+        else:
+            length += distances[previous][gene + 1]
+            load += demands[gene + 1]
+            previous = gene + 1
+
+    route_lengths.append(length + distances[previous][0])
+    loads.append(load)
+    if load > capacity:
+        penalty += OVERFILLED_VEHICLE_PENALTY * (load - capacity)
+
+    return route_lengths, loads, penalty, sum(route_lengths) + penalty
+
+
+def evaluate_population(
+    population: np.ndarray, environment: Environment
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    genes = np.asarray(population)
+    population_size, length = genes.shape
+    separators = genes < 0
+
+    # Hver rad blir depot -> gener -> depot, der separatorene også er depotet.
+    # Genene kopieres inn før + 1, så ikke int16-gener flyter over.
+    path = np.zeros((population_size, length + 2), dtype=np.intp)
+    inner = path[:, 1:-1]
+    inner[:] = genes
+    inner += 1
+    inner[separators] = 0
+    edges = environment.distance_matrix[path[:, :-1], path[:, 1:]]
+
+    # Kanten etter en separator starter en ny bil
+    _, columns = np.nonzero(separators)
+    num_vehicles = columns.size // population_size + 1
+    starts = np.zeros((population_size, num_vehicles), dtype=np.intp)
+    starts[:, 1:] = (columns + 1).reshape(population_size, num_vehicles - 1)
+    row_offsets = np.arange(population_size)[:, np.newaxis] * (length + 1)
+    route_lengths = np.add.reduceat(
+        edges.ravel(), (starts + row_offsets).ravel()
+    ).reshape(population_size, num_vehicles)
+
+    if environment.unit_demands:
+        ends = np.empty_like(starts)
+        ends[:, :-1] = starts[:, 1:]
+        ends[:, -1] = length + 1
+        loads = ends - starts - 1
+    else:
+        # Kanten inn til en by bærer byens etterspørsel, og summeres per bil
+        # akkurat som rutelengdene
+        loads = np.add.reduceat(
+            environment.demands[path[:, 1:]].ravel(),
+            (starts + row_offsets).ravel(),
+        ).reshape(population_size, num_vehicles)
+    overfill = np.maximum(loads - environment.vehicle_capacity, 0)
+    penalties = OVERFILLED_VEHICLE_PENALTY * overfill.sum(axis=1)
+
+    return route_lengths, loads, penalties, route_lengths.sum(axis=1) + penalties
+
+
+def population_distances(
+    population: np.ndarray, environment: Environment
+) -> np.ndarray:
+    return evaluate_population(population, environment)[-1]
+
+
+def load_environment(path: str):
+    # Miljøet lagres i sjekkpunktet, slik at en tilfeldig instans kan gjenskapes
+    checkpoint = load_checkpoint(path, restore_random=False)
+    if checkpoint is None:
+        return None
+
+    arrays, meta = checkpoint
+    demands = arrays.get("demands")
+    return Environment.from_coordinates(
+        arrays["coordinates"],
+        meta["num_vehicles"],
+        meta["vehicle_capacity"],
+        demands=demands[1:] if demands is not None else None,
+        edge_weight_type=meta.get("edge_weight_type"),
+    )
+
+
+def environment_checkpoint(environment: Environment):
+    return (
+        {"coordinates": environment.coordinates, "demands": environment.demands},
+        {
+            "num_vehicles": environment.num_vehicles,
+            "vehicle_capacity": environment.vehicle_capacity,
+            "edge_weight_type": environment.edge_weight_type,
+        },
+    )
+
+
+def load_cvrplib(path: str, num_vehicles: Optional[int] = None) -> Environment:
+    # Leser en CVRPLIB-instans (.vrp). Antall biler hentes fra fila eller
+    # navnet, og ellers fra hvor mange biler etterspørselen minst krever.
+    arrays, meta = load_instance(path, num_neighbours=0)
+    coordinates = np.asarray(arrays["coordinates"])
+    demands = np.asarray(arrays.get("demands", np.ones(len(coordinates), dtype=int)))
+    depots = arrays.get("depots")
+    depot = int(depots[0]) if depots is not None and len(depots) > 0 else 0
+
+    # Depotet flyttes først, slik Environment forventer
+    order = np.r_[depot, np.delete(np.arange(len(coordinates)), depot)]
+    capacity = meta.get("capacity", len(coordinates))
+    if num_vehicles is None:
+        num_vehicles = meta.get(
+            "vehicles", math.ceil(demands[order[1:]].sum() / capacity)
+        )
+
+    return Environment.from_coordinates(
+        coordinates[order],
+        num_vehicles,
+        capacity,
+        demands=demands[order[1:]],
+        edge_weight_type=meta["edge_weight_type"],
+    )
 
 
 def calculate_route_lengths(
@@ -55,9 +280,10 @@ def calculate_route_lengths(
             to_city = route[i + 1]
             distance += from_city.distance(to_city)
 
-        if len(vehicle_cities) > environment.vehicle_capacity:
+        load = sum(c.demand for c in vehicle_cities)
+        if load > environment.vehicle_capacity:
             distance += OVERFILLED_VEHICLE_PENALTY * (
-                len(vehicle_cities) - environment.vehicle_capacity
+                load - environment.vehicle_capacity
             )
 
         all_distances.append(distance)
@@ -69,44 +295,3 @@ def evaluate(solution: List[List[City]], environment: Environment) -> float:
     distance = sum(calculate_route_lengths(solution, environment))
 
     return 1 / distance
-
-
-def plot_solution(
-    solution: List[List[City]],
-    environment: Environment,
-    title: str = None,
-    ax=None,
-    background_color=None,
-) -> None:
-    plotter = ax if ax is not None else plt
-    colors = ["blue", "red", "yellow", "orange", "green", "cyan"]
-    for r, vehicle_cities in enumerate(solution):
-        color = colors[r % len(colors)]
-
-        route = [environment.depot] + vehicle_cities + [environment.depot]
-
-        for i in range(len(route) - 1):
-            plotter.plot(
-                (route[i].x, route[i + 1].x), (route[i].y, route[i + 1].y), color=color
-            )
-
-    plotter.scatter(
-        [c.x for c in environment.cities],
-        [c.y for c in environment.cities],
-        color="black",
-        s=10,
-    )
-    plotter.scatter((environment.depot.x,), (environment.depot.y,), color="green", s=50)
-
-    if title:
-        if ax is not None:
-            ax.set_title(title)
-        else:
-            plt.title(title)
-
-    if background_color is not None:
-        if ax is not None:
-            ax.set_facecolor(background_color)
-
-    if ax is None:
-        plt.show()
@@ -1,6 +1,23 @@
-from typing import List, Tuple
+from functools import partial
+from typing import List, Optional, Tuple
+import os
 import random
-from .environment import Environment, City, plot_solution, evaluate as evalute_solution
+
+import numpy as np
+
+from common.cache import EvaluationCache, canonical_chromosome_key
+from common.checkpoint import check_coordinates, load_checkpoint, save_checkpoint
+from common.islands import run_islands
+from common.observers import Observer, combine, population_metrics, timed
+from common.parallel import ParallelEvaluator
+from .environment import (
+    Environment,
+    City,
+    environment_checkpoint,
+    load_environment,
+    population_distances,
+)
+from .plotting import plot_solution
 
 
 def create_random_solution(environment: Environment) -> List[int]:
@@ -26,23 +43,63 @@ def decode_solution(solution: List[int], environment: Environment) -> List[List[
 
 def initialize_population(
     population_size: int, environment: Environment
-) -> List[List[int]]:
+) -> np.ndarray:
     population = []
 
     # TODO Initialiser populasjonen
 
-    return population
+    # Populasjonen holdes som én matrise med én rad per individ
+    return np.asarray(population, dtype=environment.genome_dtype)
+
+
+def create_evaluation_cache(capacity: int = 10000) -> EvaluationCache:
+    return EvaluationCache(capacity, key_function=canonical_chromosome_key)
+
+
+def rank_population(
+    population: np.ndarray,
+    environment: Environment,
+    cache: Optional[EvaluationCache] = None,
+    evaluator: Optional[ParallelEvaluator] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    def compute_distances(chromosomes: np.ndarray) -> np.ndarray:
+        if evaluator is not None:
+            return evaluator.evaluate(chromosomes)
+        return population_distances(chromosomes, environment)
+
+    if cache is None:
+        distances = compute_distances(
+            np.asarray(population, dtype=environment.genome_dtype)
+        )
+    else:
+        distances = np.empty(len(population))
+        keys = [cache.key_function(individual) for individual in population]
+        missing = []
+        for i, key in enumerate(keys):
+            distance = cache.get_key(key)
+            if distance is None:
+                missing.append(i)
+            else:
+                distances[i] = distance
+
+        if missing:
+            chromosomes = np.asarray(population, dtype=environment.genome_dtype)[missing]
+            distances[missing] = compute_distances(chromosomes)
+            for i in missing:
+                cache.put_key(keys[i], distances[i])
+
+    return distances, np.argsort(distances, kind="stable")
 
 
 def evaluate(
-    population: List[List[int]], environment: Environment
+    population: np.ndarray,
+    environment: Environment,
+    cache: Optional[EvaluationCache] = None,
+    evaluator: Optional[ParallelEvaluator] = None,
 ) -> List[Tuple[float, List[int]]]:
-    fitness_results = [
-        (evalute_solution(decode_solution(ind, environment), environment), ind)
-        for ind in population
-    ]
+    distances, order = rank_population(population, environment, cache, evaluator)
 
-    return sorted(fitness_results, key=lambda x: x[0], reverse=True)
+    return [(1 / distances[i], population[i]) for i in order]
 
 
 def selection(
@@ -66,12 +123,17 @@ def crossover(parent1, parent2) -> List[int]:
     return child
 
 
-def recombine(mating_pool: List[List[int]], elite_size: int) -> List[List[int]]:
-    children = mating_pool[:elite_size]
+def recombine(mating_pool: np.ndarray, elite_size: int) -> np.ndarray:
+    children = np.empty_like(mating_pool)
+    children[:elite_size] = mating_pool[:elite_size]
     length = len(mating_pool) - elite_size
 
-    pool = random.sample(mating_pool, len(mating_pool))
-    children = children + [crossover(pool[i], pool[-i - 1]) for i in range(length)]
+    # Foreldrene gis til crossover som lister, og barnet skrives rett inn i matrisen
+    pool = random.sample(range(len(mating_pool)), len(mating_pool))
+    for i in range(length):
+        children[elite_size + i] = crossover(
+            mating_pool[pool[i]].tolist(), mating_pool[pool[-i - 1]].tolist()
+        )
 
     return children
 
@@ -85,28 +147,95 @@ def mutate(individual: List[int], mutation_rate: float) -> List[int]:
 
 
 def mutate_population(
-    population: List[List[int]], mutation_rate: float,
+    population: np.ndarray, mutation_rate: float,
     elite_size: int
-) -> List[List[int]]:
-    mutated_pop = population[:elite_size] + [mutate(x, mutation_rate) for x in population[elite_size:]]
+) -> np.ndarray:
+    mutated_pop = population.copy()
+    for i in range(elite_size, len(population)):
+        mutated_pop[i] = mutate(population[i].tolist(), mutation_rate)
 
     return mutated_pop
 
 
 def next_generation(
-    current_gen: List[List[int]],
+    current_gen: np.ndarray,
     environment: Environment,
     elite_size: int,
     mutation_rate: float,
-) -> List[List[int]]:
-    pop_ranked = evaluate(current_gen, environment)
-    mating_pool = selection(pop_ranked, elite_size)
-    children = recombine(mating_pool, elite_size)
-    next_gen = mutate_population(children, mutation_rate, elite_size)
+    cache: Optional[EvaluationCache] = None,
+    evaluator: Optional[ParallelEvaluator] = None,
+    observer: Optional[Observer] = None,
+    generation: int = 0,
+) -> np.ndarray:
+    misses = cache.misses if cache is not None else 0
+    pop_ranked = timed(
+        observer, "evaluate", evaluate, current_gen, environment, cache, evaluator
+    )
+    mating_pool = timed(observer, "selection", selection, pop_ranked, elite_size)
+    mating_pool = np.asarray(mating_pool, dtype=environment.genome_dtype)
+    children = timed(observer, "recombine", recombine, mating_pool, elite_size)
+    next_gen = timed(
+        observer, "mutate", mutate_population, children, mutation_rate, elite_size
+    )
+
+    if observer is not None:
+        evaluations = cache.misses - misses if cache is not None else len(current_gen)
+        observer.on_generation(
+            generation,
+            population_metrics(
+                [1 / x[0] for x in pop_ranked], current_gen, evaluations, cache
+            ),
+        )
 
     return next_gen
 
 
+def save_population(
+    path: str,
+    population: np.ndarray,
+    history: List[Tuple[int, float, List[int]]],
+    generation: int,
+    environment: Environment,
+) -> None:
+    arrays, meta = environment_checkpoint(environment)
+    save_checkpoint(
+        path,
+        {
+            **arrays,
+            "population": np.asarray(population, dtype=environment.genome_dtype),
+            "history_chromosomes": np.asarray(
+                [x[2] for x in history], dtype=environment.genome_dtype
+            ),
+        },
+        {
+            **meta,
+            "generation": generation,
+            "history_generations": [x[0] for x in history],
+            "history_fitness": [float(x[1]) for x in history],
+        },
+    )
+
+
+def load_population(
+    path: str, environment: Environment
+) -> Optional[Tuple[np.ndarray, List[Tuple[int, float, List[int]]], int]]:
+    checkpoint = load_checkpoint(path)
+    if checkpoint is None:
+        return None
+
+    arrays, meta = checkpoint
+    check_coordinates(arrays, environment.coordinates)
+    history = list(
+        zip(
+            meta["history_generations"],
+            meta["history_fitness"],
+            arrays["history_chromosomes"].tolist(),
+        )
+    )
+    population = np.array(arrays["population"], dtype=environment.genome_dtype)
+    return population, history, meta["generation"]
+
+
 def solve(
     environment: Environment,
     population_size: int,
@@ -115,68 +244,198 @@ def solve(
     generations: int,
     eval_frequency: int = 50,
     show_plots: bool = True,
+    cache: Optional[EvaluationCache] = None,
+    workers: int = 1,
+    checkpoint_path: Optional[str] = None,
+    checkpoint_frequency: int = 100,
+    resume: bool = False,
+    headless: bool = False,
+    observers: Optional[List[Observer]] = None,
 ) -> List[int]:
-    initial_pop = initialize_population(population_size, environment)
-    best_initial_solution = evaluate(initial_pop, environment)[0]
-    print(f"Initial distance: {1 / best_initial_solution[0]}")
-    if show_plots:
+    show_plots = show_plots and not headless
+    observer = combine(observers)
+    if observer is not None:
+        observer.on_start(
+            "vrp_ga",
+            dict(
+                num_cities=len(environment.cities),
+                num_vehicles=environment.num_vehicles,
+                population_size=population_size,
+                elite_size=elite_size,
+                mutation_rate=mutation_rate,
+                generations=generations,
+            ),
+        )
+    # Evaluering fordeles på flere prosesser dersom workers > 1
+    evaluator = None
+    if workers > 1:
+        evaluator = ParallelEvaluator(population_distances, environment, workers)
+
+    try:
+        checkpoint = None
+        if resume and checkpoint_path is not None:
+            checkpoint = load_population(checkpoint_path, environment)
+
+        if checkpoint is None:
+            pop = initialize_population(population_size, environment)
+            best_initial_solution = evaluate(pop, environment, cache, evaluator)[0]
+            print(f"Initial distance: {1 / best_initial_solution[0]}")
+            if show_plots:
+                plot_solution(
+                    decode_solution(best_initial_solution[1], environment),
+                    environment,
+                    "Initial",
+                )
+
+            # Historikken lagrer kromosomene, som dekodes først når de tegnes
+            history = [
+                (0, best_initial_solution[0], best_initial_solution[1].tolist())
+            ]
+            start = 0
+        else:
+            pop, history, start = checkpoint
+            print(f"Resuming from generation {start}")
+
+        for g in range(start, generations):
+            pop = next_generation(
+                pop,
+                environment,
+                elite_size,
+                mutation_rate,
+                cache,
+                evaluator,
+                observer,
+                g + 1,
+            )
+
+            if (g + 1) % eval_frequency == 0:
+                best_current_solution = evaluate(pop, environment, cache, evaluator)[0]
+                history.append(
+                    (g, best_current_solution[0], best_current_solution[1].tolist())
+                )
+                print(
+                    f"[{g+1}/{generations}] Best distance: {1 / best_current_solution[0]}"
+                )
+
+                if show_plots:
+                    plot_solution(
+                        decode_solution(best_current_solution[1], environment),
+                        environment,
+                        f"Generation {g + 1}",
+                    )
+
+            # Lagres etter historikken, så sjekkpunktet tar med denne generasjonen
+            if checkpoint_path is not None and (g + 1) % checkpoint_frequency == 0:
+                save_population(checkpoint_path, pop, history, g + 1, environment)
+
+        best_final_solution = evaluate(pop, environment, cache, evaluator)[0]
+        print(f"Final distance: {1 / best_final_solution[0]}")
+        if observer is not None:
+            observer.on_end({"best_distance": float(1 / best_final_solution[0])})
+    finally:
+        if evaluator is not None:
+            evaluator.close()
+
+    print(f"Final chromosome: {best_final_solution[1].tolist()}")
+    if not headless:
         plot_solution(
-            decode_solution(best_initial_solution[1], environment),
+            decode_solution(best_final_solution[1], environment),
             environment,
-            "Initial",
+            "Final solution",
         )
 
-    pop = initial_pop
-    history = [
-        (
-            0,
-            best_initial_solution[0],
-            decode_solution(best_initial_solution[1], environment),
-        )
-    ]
 
-    for g in range(generations):
-        pop = next_generation(pop, environment, elite_size, mutation_rate)
+def solve_islands(
+    environment: Environment,
+    population_size: int,
+    elite_size: int,
+    mutation_rate: float,
+    generations: int,
+    islands: Optional[int] = None,
+    migration_interval: int = 10,
+    migration_size: int = 2,
+    topology: str = "ring",
+    show_plots: bool = True,
+    headless: bool = False,
+    seed: Optional[int] = None,
+) -> List[int]:
+    show_plots = show_plots and not headless
+    # Én øy per kjerne dersom ikke annet er oppgitt
+    islands = islands or os.cpu_count()
+
+    distance, chromosome = run_islands(
+        initialize=partial(initialize_population, population_size, environment),
+        step=partial(
+            next_generation,
+            environment=environment,
+            elite_size=elite_size,
+            mutation_rate=mutation_rate,
+        ),
+        rank=partial(rank_population, environment=environment),
+        generations=generations,
+        islands=islands,
+        migration_interval=migration_interval,
+        migration_size=migration_size,
+        topology=topology,
+        seed=seed,
+    )
+    chromosome = chromosome.tolist()
+    print(f"Final distance: {distance}")
+    print(f"Final chromosome: {chromosome}")
 
-        if (g + 1) % eval_frequency == 0:
-            best_current_solution = evaluate(pop, environment)[0]
-            history.append(
-                (
-                    g,
-                    best_current_solution[0],
-                    decode_solution(best_current_solution[1], environment),
-                )
-            )
-            print(
-                f"[{g+1}/{generations}] Best distance: {1 / best_current_solution[0]}"
-            )
+    if show_plots:
+        plot_solution(
+            decode_solution(chromosome, environment), environment, "Final solution"
+        )
 
-            if show_plots:
-                plot_solution(history[-1][2], environment, f"Generation {g + 1}")
+    return chromosome
+
+
+def main(
+    checkpoint_path: Optional[str] = None,
+    resume: bool = False,
+    headless: bool = False,
+    observers: Optional[List[Observer]] = None,
+):
+    environment = None
+    if resume and checkpoint_path is not None:
+        environment = load_environment(checkpoint_path)
+    if environment is None:
+        environment = Environment(
+            num_cities=25, num_vehicles=5, vehicle_capacity=8, seed=None
+        )
 
-    best_final_solution = evaluate(pop, environment)[0]
-    print(f"Final distance: {1 / best_final_solution[0]}")
-    print(f"Final chromosome: {best_final_solution[1]}")
-    plot_solution(
-        decode_solution(best_final_solution[1], environment),
+    solve(
         environment,
-        "Final solution",
+        population_size=50,
+        elite_size=3,
+        mutation_rate=0.05,
+        generations=2000,
+        eval_frequency=100,
+        show_plots=False,
+        checkpoint_path=checkpoint_path,
+        checkpoint_frequency=100,
+        resume=resume,
+        headless=headless,
+        observers=observers,
     )
 
 
-def main():
+def main_islands(headless: bool = False):
     environment = Environment(
         num_cities=25, num_vehicles=5, vehicle_capacity=8, seed=None
     )
 
-    solve(
+    solve_islands(
         environment,
         population_size=50,
         elite_size=3,
         mutation_rate=0.05,
         generations=2000,
-        eval_frequency=100,
+        migration_interval=50,
+        migration_size=2,
         show_plots=False,
+        headless=headless,
     )
 
 
@@ -1,11 +1,20 @@
+from functools import partial
+from multiprocessing import Pool
 import random
-from typing import List
+from typing import List, Optional
 
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-from matplotlib.animation import FuncAnimation
 
+from common.animation import FrameWriter
+from common.checkpoint import (
+    check_coordinates,
+    load_checkpoint,
+    restore_random_state,
+    save_checkpoint,
+)
+from common.observers import Observer, combine, timed
+from common.plotting import pyplot
+from common.shared_memory import attach_shared_array, create_shared_array
 from .genetic_algorithm import (
     crossover,
     mutate,
@@ -13,86 +22,258 @@ from .genetic_algorithm import (
     create_random_solution,
 )
 from .environment import (
-    calculate_route_lengths,
+    OVERFILLED_VEHICLE_PENALTY,
+    evaluate_chromosome,
+    evaluate_population,
     Environment,
-    plot_solution,
+    environment_checkpoint,
+    load_environment,
 )
+from .plotting import plot_solution
+
+
+# Beskrivelsene regnes ut fra rutelengdene og lastene til hver bil (én rad per
+# løsning), og er normalisert til [0, 1)
+
+
+def average_route_length_descriptor(route_lengths, loads, archive):
+    non_zero = route_lengths > 0
+    avg = (route_lengths * non_zero).sum(axis=1) / non_zero.sum(axis=1)
+    return np.minimum(0.99999, avg / float(archive.max_average_route_length))
+
+
+def num_cars_descriptor(route_lengths, loads, archive):
+    return ((loads > 0).sum(axis=1) - 1) / loads.shape[1]
+
+
+def max_route_length_descriptor(route_lengths, loads, archive):
+    longest = route_lengths.max(axis=1)
+    return np.minimum(0.99999, longest / float(archive.max_average_route_length))
+
+
+def load_imbalance_descriptor(route_lengths, loads, archive):
+    imbalance = (loads.max(axis=1) - loads.min(axis=1)) / loads.sum(axis=1)
+    return np.minimum(0.99999, imbalance)
+
+
+DESCRIPTORS = {
+    "average_route_length": average_route_length_descriptor,
+    "num_cars": num_cars_descriptor,
+    "max_route_length": max_route_length_descriptor,
+    "load_imbalance": load_imbalance_descriptor,
+}
+
+DESCRIPTOR_LABELS = {
+    "average_route_length": "Gjennomsnittlig rutelengde",
+    "num_cars": "Antall biler",
+    "max_route_length": "Lengste rute",
+    "load_imbalance": "Ubalanse i last",
+}
 
 
 class Archive:
+    descriptors = ("average_route_length", "num_cars")
+
     def __init__(
         self,
         environment,
         num_cars_dimension_size,
         average_route_length_dimension_size,
         max_average_route_length=2000,
+        shared=False,
+        shared_memory_names=None,
     ):
         self.num_cars_dimension_size = num_cars_dimension_size
         self.average_route_length_dimension_size = average_route_length_dimension_size
         self.max_average_route_length = max_average_route_length
-        self.archive = [
-            [(-1, None) for _ in range(num_cars_dimension_size)]
-            for _ in range(average_route_length_dimension_size)
-        ]
         self.environment = environment
 
-    def _get_num_cars(self, solution):
-        max_num = sum(1 if x < 0 else 0 for x in solution) + 1
-        decoded_solution = decode_solution(solution, self.environment)
-        num = sum(1 for x in decoded_solution if len(x) > 0)
-
-        return int(((num - 1) / max_num) * self.num_cars_dimension_size)
-
-    def _get_average_route_length(self, route_lengths):
-        non_zero_lengths = [x for x in route_lengths if x > 0]
-        avg = sum(non_zero_lengths) / len(non_zero_lengths)
-
-        return int(
-            min(0.99999, (avg / float(self.max_average_route_length)))
-            * self.average_route_length_dimension_size
+        # Cellene indekseres med [average_route_length][num_cars]
+        shape = (average_route_length_dimension_size, num_cars_dimension_size)
+        self._allocate(shape, shared, shared_memory_names)
+
+    def _allocate(self, shape, shared=False, shared_memory_names=None):
+        # Tomme celler har score -1
+        genome_length = len(self.environment.cities) + self.environment.num_vehicles - 1
+        genome_shape = shape + (genome_length,)
+        self._shared_memory = []
+
+        # Arkivet kan ligge i delt minne, slik at andre prosesser kan lese det
+        if shared_memory_names is not None:
+            scores_name, genomes_name = shared_memory_names
+            self.scores, scores_memory = attach_shared_array(
+                scores_name, shape, np.float64
+            )
+            self.genomes, genomes_memory = attach_shared_array(
+                genomes_name, genome_shape, self.environment.genome_dtype
+            )
+            self._shared_memory = [scores_memory, genomes_memory]
+        elif shared:
+            self.scores, scores_memory = create_shared_array(shape, np.float64)
+            self.genomes, genomes_memory = create_shared_array(
+                genome_shape, self.environment.genome_dtype
+            )
+            self.scores[:] = -1.0
+            self.genomes[:] = 0
+            self._shared_memory = [scores_memory, genomes_memory]
+        else:
+            self.scores = np.full(shape, -1.0)
+            self.genomes = np.zeros(genome_shape, dtype=self.environment.genome_dtype)
+
+        self.occupied = []
+        self.best_cell = None
+
+    def worker_arguments(self):
+        return dict(
+            environment=self.environment,
+            num_cars_dimension_size=self.num_cars_dimension_size,
+            average_route_length_dimension_size=self.average_route_length_dimension_size,
+            max_average_route_length=self.max_average_route_length,
+            shared_memory_names=self.shared_memory_names,
         )
 
+    @property
+    def shared_memory_names(self):
+        if not self._shared_memory:
+            return None
+        return tuple(memory.name for memory in self._shared_memory)
+
+    def close(self, unlink=True):
+        # Kopierer arkivet ut av delt minne før minnet frigis
+        self.scores = self.scores.copy()
+        self.genomes = self.genomes.copy()
+        for memory in self._shared_memory:
+            memory.close()
+            if unlink:
+                memory.unlink()
+        self._shared_memory = []
+
+    def restore(self, scores, genomes, occupied=None):
+        # Uten delt minne brukes de minnemappede arrayene direkte
+        if self._shared_memory:
+            self.scores[:] = scores
+            self.genomes[:] = genomes
+        else:
+            self.scores, self.genomes = scores, genomes
+
+        # Rekkefølgen på de okkuperte cellene påvirker hvilke foreldre som trekkes
+        if occupied is None:
+            occupied = np.flatnonzero(self.scores.reshape(-1) != -1)
+        self.occupied = np.asarray(occupied).tolist()
+        self.best_cell = None
+        if self.occupied:
+            best = np.unravel_index(self.scores.argmax(), self.scores.shape)
+            self.best_cell = tuple(int(x) for x in best)
+
     def evaluate_and_replace_solution(self, new_solution):
-        route_lengths = calculate_route_lengths(
-            decode_solution(new_solution, self.environment), self.environment
+        # Fitness og alle beskrivelser regnes ut fra én gjennomgang av genomet
+        route_lengths, loads, _, total = evaluate_chromosome(
+            new_solution, self.environment
         )
-        average_route_length = self._get_average_route_length(route_lengths)
-        num_cars = self._get_num_cars(new_solution)
+        descriptors = self._describe(np.array([route_lengths]), np.array([loads]))
+        flat_cell = self._get_cells(descriptors)[0]
 
-        score = 1 / sum(route_lengths)
+        score = 1 / total
+        cell = tuple(int(x) for x in np.unravel_index(flat_cell, self.scores.shape))
 
         # TODO Finn ut om vi har funnet en bedre løsning, og erstatt i så fall den gamle løsningen i arkivet
-        # Tips: Løsningen vi har funnet skal inn i self.archive[average_route_length][num_cars].
-        # Løsninger lagres i arkivet som en tuppel (score, solution).
+        # Tips: Scoren til løsningen som ligger i cellen nå finnes i self.scores[cell] (-1 betyr tom celle).
+        # Bruk self.insert(cell, score, new_solution) for å legge inn en ny løsning.
+
+    def insert(self, cell, score, solution):
+        previous_score = self.scores[cell]
+        if previous_score == -1:
+            self.occupied.append(np.ravel_multi_index(cell, self.scores.shape))
+
+        self.scores[cell] = score
+        self.genomes[cell] = solution
+
+        if self.best_cell is None or score > self.scores[self.best_cell]:
+            self.best_cell = cell
+        elif cell == self.best_cell and score < previous_score:
+            self.best_cell = np.unravel_index(self.scores.argmax(), self.scores.shape)
+
+    def evaluate_and_replace_solutions(self, new_solutions):
+        genomes = np.asarray(new_solutions)
+        cells, scores = self.describe_solutions(genomes)
+        self.insert_many(cells, scores, genomes)
 
-    def _get_flattened_archive(self):
-        return [x for y in self.archive for x in y if x[0] != -1]
+    def describe_solutions(self, genomes):
+        descriptors, scores = self.compute_descriptors(genomes)
+        return self._get_cells(descriptors), scores
+
+    def _get_cells(self, descriptors):
+        dimensions = self.scores.shape
+        cells = (descriptors * np.array(dimensions)).astype(int)
+        return np.ravel_multi_index(tuple(cells.T), dimensions)
+
+    def compute_descriptors(self, genomes):
+        route_lengths, loads, _, totals = evaluate_population(genomes, self.environment)
+
+        return self._describe(route_lengths, loads), 1 / totals
+
+    def _describe(self, route_lengths, loads):
+        # Som i calculate_route_lengths regnes straffen med i lengden på ruta
+        overfill = np.maximum(loads - self.environment.vehicle_capacity, 0)
+        route_lengths = route_lengths + OVERFILLED_VEHICLE_PENALTY * overfill
+
+        descriptors = [
+            DESCRIPTORS[name](route_lengths, loads, self) for name in self.descriptors
+        ]
+        return np.stack(descriptors, axis=1)
+
+    def insert_many(self, cells, scores, genomes):
+        # Elitistisk erstatning for batcher og parallelle kjøringer: bare den
+        # beste løsningen per celle i batchen beholdes, og den erstatter
+        # løsningen i cellen bare hvis scoren er høyere. Regelen i
+        # evaluate_and_replace_solution brukes ikke her.
+        order = np.lexsort((-scores, cells))
+        cells, scores, genomes = cells[order], scores[order], genomes[order]
+        first = np.ones(len(cells), dtype=bool)
+        first[1:] = cells[1:] != cells[:-1]
+        cells, scores, genomes = cells[first], scores[first], genomes[first]
+
+        flat_scores = self.scores.reshape(-1)
+        better = scores > flat_scores[cells]
+        cells, scores, genomes = cells[better], scores[better], genomes[better]
+        if len(cells) == 0:
+            return
+
+        self.occupied.extend(cells[flat_scores[cells] == -1].tolist())
+        flat_scores[cells] = scores
+        self.genomes.reshape(-1, self.genomes.shape[-1])[cells] = genomes
+
+        best = scores.argmax()
+        if self.best_cell is None or scores[best] > self.scores[self.best_cell]:
+            self.best_cell = tuple(
+                int(x) for x in np.unravel_index(cells[best], self.scores.shape)
+            )
 
     def draw_random_solutions(self, n=1):
-        pool = self._get_flattened_archive()
+        genomes = self.genomes.reshape(-1, self.genomes.shape[-1])
 
-        return [x[1] for x in random.sample(pool, n)]
+        return [genomes[i].tolist() for i in random.sample(self.occupied, n)]
 
-    def get_scores_as_array(self):
-        scores = np.array(
-            [
-                [self.archive[x][y][0] for y in range(self.num_cars_dimension_size)]
-                for x in range(self.average_route_length_dimension_size)
-            ]
-        )
+    def draw_random_parent_pairs(self, n=1):
+        genomes = self.genomes.reshape(-1, self.genomes.shape[-1])
 
-        return scores
+        return [
+            [genomes[i].tolist() for i in random.sample(self.occupied, 2)]
+            for _ in range(n)
+        ]
+
+    def get_scores_as_array(self, copy=True):
+        return self.scores.copy() if copy else self.scores
 
     def get_best_score(self):
-        return max(self._get_flattened_archive(), key=lambda x: x[0])[0]
+        return self.scores[self.best_cell]
 
     def get_best_solution(self):
-        return max(self._get_flattened_archive(), key=lambda x: x[0])[1]
+        return self.genomes[self.best_cell].tolist()
+
+    def draw_scores(self, ax, data: np.ndarray, vmax: float, colorbar: bool = True):
+        import seaborn as sns
 
-    def plot_score_history(
-        self, scores: List[np.ndarray], eval_frequency: int, show_plot: bool = True
-    ):
-        best_score = max(x.max() for x in scores)
         ticks = list(
             (i + 1)
             * (
@@ -101,6 +282,32 @@ class Archive:
             )
             for i in range(self.average_route_length_dimension_size)
         )
+        sns.heatmap(
+            data.T,
+            vmin=0,
+            vmax=vmax,
+            mask=(data.T == -1),
+            annot=True,
+            xticklabels=ticks,
+            cbar=colorbar,
+            ax=ax,
+        )
+
+    def draw_score_frame(self, figure, data: np.ndarray, step: int):
+        ax = figure.add_subplot()
+        figure.suptitle("History of archive scores")
+        self.draw_scores(ax, data, data.max())
+        ax.set_xlabel("Gjennomsnittlig rutelengde")
+        ax.set_ylabel("Antall biler")
+        ax.set_title(f"Step {step:06}")
+
+    def plot_score_history(
+        self, scores: List[np.ndarray], eval_frequency: int, show_plot: bool = True
+    ):
+        from matplotlib.animation import FuncAnimation
+
+        plt = pyplot()
+        best_score = max(x.max() for x in scores)
 
         fig = plt.figure(figsize=(15, 10))
         fig.suptitle("History of archive scores (animated)")
@@ -109,17 +316,8 @@ class Archive:
 
         def plot(data: np.ndarray):
             nonlocal cbar
-            data = data.T
             plt.cla()
-            sns.heatmap(
-                data,
-                vmin=0,
-                vmax=best_score,
-                mask=(scores == -1),
-                annot=True,
-                xticklabels=ticks,
-                cbar=cbar,
-            )
+            self.draw_scores(plt.gca(), data, best_score, cbar)
             cbar = False
 
         def init():
@@ -137,23 +335,23 @@ class Archive:
         return anim
 
     def plot_archive_solutions(self, show_plot: bool = True):
+        plt = pyplot()
         fig, axes = plt.subplots(
             self.num_cars_dimension_size,
             self.average_route_length_dimension_size,
             figsize=(15, 10),
         )
         fig.suptitle("All solutions from archive")
-        best_solution = self.get_best_solution()
 
         for y in range(self.average_route_length_dimension_size):
             for x in range(self.num_cars_dimension_size):
-                solution = self.archive[y][x][1]
+                if self.scores[y, x] == -1:
+                    continue
+
+                solution = self.genomes[y, x].tolist()
                 background_color = (
-                    "xkcd:mint green" if solution == best_solution else None
+                    "xkcd:mint green" if (y, x) == self.best_cell else None
                 )
-
-                if solution is None:
-                    continue
                 plot_solution(
                     decode_solution(solution, self.environment),
                     self.environment,
@@ -166,18 +364,270 @@ class Archive:
         return fig
 
 
+def calculate_centroids(
+    num_niches: int,
+    num_dimensions: int,
+    num_samples: int = 20000,
+    iterations: int = 20,
+    seed=None,
+) -> np.ndarray:
+    from scipy.spatial import cKDTree
+
+    # Enkel k-means på tilfeldige punkter i beskrivelsesrommet. Hver nisje
+    # trenger flere punkter enn ett, ellers kan ikke sentrene trekkes.
+    num_samples = max(num_samples, 10 * num_niches)
+    rng = np.random.default_rng(seed)
+    samples = rng.random((num_samples, num_dimensions))
+    centroids = samples[rng.choice(num_samples, num_niches, replace=False)]
+
+    for _ in range(iterations):
+        _, labels = cKDTree(centroids).query(samples)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, samples)
+        counts = np.bincount(labels, minlength=num_niches)
+        non_empty = counts > 0
+        centroids[non_empty] = sums[non_empty] / counts[non_empty, np.newaxis]
+
+    return centroids
+
+
+class CVTArchive(Archive):
+    def __init__(
+        self,
+        environment,
+        num_niches=100,
+        max_average_route_length=2000,
+        descriptors=("average_route_length", "num_cars"),
+        centroids=None,
+        seed=None,
+        shared=False,
+        shared_memory_names=None,
+    ):
+        from scipy.spatial import cKDTree
+
+        self.num_niches = num_niches
+        self.max_average_route_length = max_average_route_length
+        self.descriptors = tuple(descriptors)
+        self.environment = environment
+
+        # Nisjene er Voronoi-celler rundt sentroidene. Minnebruken vokser med
+        # antall nisjer, ikke med produktet av dimensjonsstørrelsene.
+        if centroids is None:
+            centroids = calculate_centroids(
+                num_niches, len(self.descriptors), seed=seed
+            )
+        self.centroids = centroids
+        self.tree = cKDTree(centroids)
+        self._allocate((num_niches,), shared, shared_memory_names)
+
+    def worker_arguments(self):
+        return dict(
+            environment=self.environment,
+            num_niches=self.num_niches,
+            max_average_route_length=self.max_average_route_length,
+            descriptors=self.descriptors,
+            centroids=self.centroids,
+            shared_memory_names=self.shared_memory_names,
+        )
+
+    def _get_cells(self, descriptors):
+        _, cells = self.tree.query(descriptors)
+        return cells
+
+    def evaluate_and_replace_solution(self, new_solution):
+        self.evaluate_and_replace_solutions([new_solution])
+
+    def draw_scores(self, ax, data: np.ndarray, vmax: float, colorbar: bool = True):
+        # Én scatter for tomme nisjer og én for fylte, uansett antall nisjer.
+        # Med én beskrivelse vises scoren langs y-aksen, og med flere enn to
+        # projiseres sentroidene ned på de to første beskrivelsene.
+        labels = [DESCRIPTOR_LABELS.get(name, name) for name in self.descriptors]
+        empty = data == -1
+        x = self.centroids[:, 0]
+        if len(self.descriptors) == 1:
+            y = np.where(empty, 0, data)
+            y_label = "Score"
+        else:
+            y = self.centroids[:, 1]
+            y_label = labels[1]
+
+        ax.scatter(x[empty], y[empty], c="lightgray", s=20)
+        points = ax.scatter(
+            x[~empty], y[~empty], c=data[~empty], vmin=0, vmax=vmax, s=60
+        )
+        if colorbar:
+            ax.figure.colorbar(points, ax=ax)
+        ax.set_xlabel(labels[0])
+        ax.set_ylabel(y_label)
+
+    def plot_score_history(
+        self, scores: List[np.ndarray], eval_frequency: int, show_plot: bool = True
+    ):
+        from matplotlib.animation import FuncAnimation
+
+        plt = pyplot()
+        best_score = max(x.max() for x in scores)
+        fig = plt.figure(figsize=(15, 10))
+        fig.suptitle("History of archive scores (animated)")
+
+        def plot(data: np.ndarray):
+            plt.cla()
+            self.draw_scores(plt.gca(), data, best_score, colorbar=False)
+
+        def update(i: int):
+            plot(scores[i])
+            plt.title(f"Step {(i + 1) * eval_frequency:06}")
+
+        plot(scores[0])
+        anim = FuncAnimation(fig, update, np.arange(1, len(scores)))
+        if show_plot:
+            plt.show()
+        return anim
+
+    def plot_archive_solutions(self, show_plot: bool = True, max_solutions: int = 25):
+        plt = pyplot()
+        niches = np.flatnonzero(self.scores != -1)
+        niches = niches[np.argsort(-self.scores[niches])][:max_solutions]
+        cols = min(len(niches), 5)
+        rows = int(np.ceil(len(niches) / 5))
+
+        fig, axes = plt.subplots(rows, cols, figsize=(15, 10), squeeze=False)
+        fig.suptitle("Best solutions from archive")
+
+        for ax, niche in zip(axes.flatten(), niches):
+            background_color = "xkcd:mint green" if (niche,) == self.best_cell else None
+            plot_solution(
+                decode_solution(self.genomes[niche].tolist(), self.environment),
+                self.environment,
+                ax=ax,
+                background_color=background_color,
+            )
+
+        if show_plot:
+            plt.show()
+        return fig
+
+
 def initialize(archive: Archive, environment: Environment, n_solutions: int = 10):
     for _ in range(n_solutions):
         solution = create_random_solution(environment)
         archive.evaluate_and_replace_solution(solution)
 
 
-def advance_single_step(archive: Archive, mutation_rate: float):
-    parents = archive.draw_random_solutions(2)
-    child = crossover(parents[0], parents[1])
-    mutated_child = mutate(child, mutation_rate)
+def advance_single_step(
+    archive: Archive, mutation_rate: float, observer: Optional[Observer] = None
+):
+    # Stegene er så raske at tidtakingen bare gjøres når noen observerer
+    if observer is None:
+        parents = archive.draw_random_solutions(2)
+        child = crossover(parents[0], parents[1])
+        archive.evaluate_and_replace_solution(mutate(child, mutation_rate))
+        return
 
-    archive.evaluate_and_replace_solution(mutated_child)
+    parents = timed(observer, "selection", archive.draw_random_solutions, 2)
+    child = timed(observer, "recombine", crossover, parents[0], parents[1])
+    mutated_child = timed(observer, "mutate", mutate, child, mutation_rate)
+
+    timed(observer, "evaluate", archive.evaluate_and_replace_solution, mutated_child)
+
+
+def advance_batch(
+    archive: Archive,
+    mutation_rate: float,
+    batch_size: int,
+    observer: Optional[Observer] = None,
+):
+    if observer is None:
+        parents = archive.draw_random_parent_pairs(batch_size)
+        children = [crossover(p[0], p[1]) for p in parents]
+        children = [mutate(x, mutation_rate) for x in children]
+        archive.evaluate_and_replace_solutions(children)
+        return
+
+    parents = timed(observer, "selection", archive.draw_random_parent_pairs, batch_size)
+    children = timed(
+        observer, "recombine", lambda: [crossover(p[0], p[1]) for p in parents]
+    )
+    children = timed(
+        observer, "mutate", lambda: [mutate(x, mutation_rate) for x in children]
+    )
+
+    timed(observer, "evaluate", archive.evaluate_and_replace_solutions, children)
+
+
+_worker_archive = None
+_worker_mutation_rate = None
+
+
+def _initialize_worker(archive_class, archive_arguments, mutation_rate):
+    global _worker_archive, _worker_mutation_rate
+    _worker_archive = archive_class(**archive_arguments)
+    _worker_mutation_rate = mutation_rate
+
+
+def _generate_children(task):
+    task_seed, n = task
+    random.seed(task_seed)
+
+    archive = _worker_archive
+    archive.occupied = np.flatnonzero(archive.scores.reshape(-1) != -1).tolist()
+    parents = archive.draw_random_parent_pairs(n)
+    children = np.asarray(
+        [mutate(crossover(p[0], p[1]), _worker_mutation_rate) for p in parents]
+    )
+    cells, scores = archive.describe_solutions(children)
+
+    return cells, scores, children
+
+
+def create_worker_pool(archive: Archive, workers: int, mutation_rate: float) -> Pool:
+    # Avstandsmatrisen bygges før miljøet sendes til arbeiderne
+    archive.environment.distance_matrix
+    return Pool(
+        workers,
+        initializer=_initialize_worker,
+        initargs=(type(archive), archive.worker_arguments(), mutation_rate),
+    )
+
+
+def advance_parallel(
+    archive: Archive,
+    pool: Pool,
+    n: int,
+    workers: int,
+    observer: Optional[Observer] = None,
+):
+    # Arkivet endres ikke mens arbeiderne kjører, og resultatene legges inn i
+    # fast rekkefølge, så kjøringen er reproduserbar gitt seed og antall arbeidere
+    sizes = [n // workers + (1 if w < n % workers else 0) for w in range(workers)]
+    tasks = [(random.getrandbits(64), size) for size in sizes if size > 0]
+    results = timed(observer, "workers", pool.map, _generate_children, tasks)
+
+    timed(
+        observer,
+        "insert",
+        archive.insert_many,
+        np.concatenate([x[0] for x in results]),
+        np.concatenate([x[1] for x in results]),
+        np.concatenate([x[2] for x in results]),
+    )
+
+
+def save_archive(
+    path: str, archive: Archive, score_history: List[np.ndarray], step: int
+) -> None:
+    arrays, meta = environment_checkpoint(archive.environment)
+    arrays.update(
+        scores=archive.scores,
+        genomes=archive.genomes,
+        occupied=np.asarray(archive.occupied, dtype=np.int64),
+    )
+    if score_history:
+        arrays["score_history"] = np.stack(score_history)
+    if isinstance(archive, CVTArchive):
+        arrays["centroids"] = archive.centroids
+
+    save_checkpoint(path, arrays, {**meta, "step": step})
 
 
 def solve(
@@ -188,37 +638,159 @@ def solve(
     num_cars_dimension_size: int = 5,
     average_route_length_dimension_size: int = 10,
     max_average_route_length: int = 1000,
+    batch_size: int = 1,
+    workers: int = 1,
+    seed: Optional[int] = None,
+    archive_type: str = "grid",
+    num_niches: int = 100,
+    descriptors: List[str] = ("average_route_length", "num_cars"),
+    checkpoint_path: Optional[str] = None,
+    checkpoint_frequency: int = 10000,
+    resume: bool = False,
+    headless: bool = False,
+    animation_path: Optional[str] = None,
+    observers: Optional[List[Observer]] = None,
 ):
-    archive = Archive(
-        environment,
-        num_cars_dimension_size=num_cars_dimension_size,
-        average_route_length_dimension_size=average_route_length_dimension_size,
-        max_average_route_length=max_average_route_length,
-    )
+    observer = combine(observers)
+    if observer is not None:
+        observer.on_start(
+            "vrp_me",
+            dict(
+                num_cities=len(environment.cities),
+                num_vehicles=environment.num_vehicles,
+                steps=steps,
+                mutation_rate=mutation_rate,
+                archive_type=archive_type,
+                workers=workers,
+            ),
+        )
 
-    initialize(archive, environment, n_solutions=10)
-    score_history = []
+    checkpoint = None
+    if resume and checkpoint_path is not None:
+        checkpoint = load_checkpoint(checkpoint_path, restore_random=False)
+
+    if archive_type == "cvt":
+        archive = CVTArchive(
+            environment,
+            num_niches=num_niches,
+            max_average_route_length=max_average_route_length,
+            descriptors=descriptors,
+            centroids=checkpoint[0]["centroids"] if checkpoint else None,
+            seed=seed,
+            shared=workers > 1,
+        )
+    else:
+        archive = Archive(
+            environment,
+            num_cars_dimension_size=num_cars_dimension_size,
+            average_route_length_dimension_size=average_route_length_dimension_size,
+            max_average_route_length=max_average_route_length,
+            shared=workers > 1,
+        )
 
+    if seed is not None:
+        random.seed(seed)
+
+    if checkpoint is None:
+        initialize(archive, environment, n_solutions=10)
+        score_history = []
+        start = 0
+    else:
+        arrays, meta = checkpoint
+        check_coordinates(arrays, environment.coordinates)
+        archive.restore(arrays["scores"], arrays["genomes"], arrays["occupied"])
+        restore_random_state(arrays, meta)
+        score_history = list(arrays.get("score_history", []))
+        start = meta["step"]
+        print(f"Resuming from step {start}")
+
+    pool = create_worker_pool(archive, workers, mutation_rate) if workers > 1 else None
+    step_size = batch_size * workers
+    completed = start
+
+    # Med animation_path skrives hver frame rett til fil i stedet for å samle
+    # hele historikken i minnet
+    writer = FrameWriter(animation_path) if animation_path is not None else None
+
+    # Enkeltsteg bruker erstatningsregelen i evaluate_and_replace_solution.
+    # Med batch_size > 1 eller workers > 1 legges løsningene inn med
+    # insert_many, som har sin egen elitistiske regel (høyest score vinner).
     try:
-        for g in range(steps):
-            advance_single_step(archive, mutation_rate)
+        for g in range(start, steps, step_size):
+            n = min(step_size, steps - g)
+            if pool is not None:
+                advance_parallel(archive, pool, n, workers, observer)
+            elif n == 1:
+                advance_single_step(archive, mutation_rate, observer)
+            else:
+                advance_batch(archive, mutation_rate, n, observer)
+            completed = g + n
+
+            if observer is not None:
+                observer.on_generation(
+                    g + n,
+                    {
+                        "best_distance": float(1 / archive.get_best_score()),
+                        "coverage": len(archive.occupied) / archive.scores.size,
+                        "evaluations": n,
+                    },
+                )
 
-            if (g + 1) % eval_frequency == 0:
+            if (g + n) // eval_frequency > g // eval_frequency:
                 best_current_score = archive.get_best_score()
-                print(f"[{g + 1}/{steps}] Best distance: {1 / best_current_score}")
-                score_history.append(archive.get_scores_as_array())
+                print(f"[{g + n}/{steps}] Best distance: {1 / best_current_score}")
+                if writer is not None:
+                    writer.append(
+                        partial(
+                            archive.draw_score_frame,
+                            data=archive.get_scores_as_array(),
+                            step=g + n,
+                        )
+                    )
+                else:
+                    score_history.append(archive.get_scores_as_array())
+
+            if checkpoint_path is not None and (
+                (g + n) // checkpoint_frequency > g // checkpoint_frequency
+            ):
+                save_archive(checkpoint_path, archive, score_history, completed)
     except KeyboardInterrupt:
-        pass
-
-    archive_fig = archive.plot_archive_solutions(show_plot=False)
-    anim = archive.plot_score_history(score_history, eval_frequency, show_plot=False)
-    plt.show()
+        # Lagrer et sjekkpunkt slik at kjøringen kan fortsettes senere
+        if checkpoint_path is not None:
+            save_archive(checkpoint_path, archive, score_history, completed)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+            archive.close()
+        if writer is not None:
+            writer.close()
+
+    if observer is not None:
+        observer.on_end({"best_distance": float(1 / archive.get_best_score())})
+
+    if not headless:
+        archive_fig = archive.plot_archive_solutions(show_plot=False)
+        if score_history:
+            anim = archive.plot_score_history(
+                score_history, eval_frequency, show_plot=False
+            )
+        pyplot().show()
 
 
-def main():
-    environment = Environment(
-        num_cities=25, num_vehicles=5, vehicle_capacity=9, seed=None
-    )
+def main(
+    checkpoint_path: Optional[str] = None,
+    resume: bool = False,
+    headless: bool = False,
+    observers: Optional[List[Observer]] = None,
+):
+    environment = None
+    if resume and checkpoint_path is not None:
+        environment = load_environment(checkpoint_path)
+    if environment is None:
+        environment = Environment(
+            num_cities=25, num_vehicles=5, vehicle_capacity=9, seed=None
+        )
 
     solve(
         environment,
@@ -228,4 +800,9 @@ def main():
         num_cars_dimension_size=environment.num_vehicles,
         average_route_length_dimension_size=10,
         max_average_route_length=3000,
+        checkpoint_path=checkpoint_path,
+        checkpoint_frequency=10000,
+        resume=resume,
+        headless=headless,
+        observers=observers,
     )
@@ -0,0 +1,40 @@
+from typing import List
+
+from common.plotting import pyplot
+from .environment import City, Environment
+
+
+def plot_solution(
+    solution: List[List[City]],
+    environment: Environment,
+    title: str = None,
+    ax=None,
+    background_color=None,
+) -> None:
+    from matplotlib.collections import LineCollection
+
+    plt = pyplot()
+    plotter = ax if ax is not None else plt.gca()
+    colors = ["blue", "red", "yellow", "orange", "green", "cyan"]
+
+    # Alle kantene samles i én LineCollection i stedet for én linje per kant
+    segments, segment_colors = [], []
+    depot = (environment.depot.x, environment.depot.y)
+    for r, vehicle_cities in enumerate(solution):
+        route = [depot] + [(c.x, c.y) for c in vehicle_cities] + [depot]
+        segments.extend(zip(route[:-1], route[1:]))
+        segment_colors.extend([colors[r % len(colors)]] * (len(route) - 1))
+    plotter.add_collection(LineCollection(segments, colors=segment_colors))
+
+    cities = environment.coordinates[1:]
+    plotter.scatter(cities[:, 0], cities[:, 1], color="black", s=10)
+    plotter.scatter((environment.depot.x,), (environment.depot.y,), color="green", s=50)
+
+    if title:
+        plotter.set_title(title)
+
+    if background_color is not None and ax is not None:
+        ax.set_facecolor(background_color)
+
+    if ax is None:
+        plt.show()